@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Списки параметров IN (%s, %s, ...) разной длины дают один отпечаток
+SQL_PARAMS_LIST_RE = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+
+
+def get_sql_fingerprint(sql):
+    """Отпечаток запроса: SQL без значений параметров (Django передает их отдельно), 12 символов sha1"""
+
+    return hashlib.sha1(SQL_PARAMS_LIST_RE.sub("(...)", sql).encode()).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """Обертка выполнения запросов (connection.execute_wrapper): число, суммарное время и отпечатки запросов"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            fingerprint = get_sql_fingerprint(sql)
+            self.fingerprints[fingerprint] += 1
+            self.samples.setdefault(fingerprint, sql)
+
+    def get_duplicates(self):
+        """{отпечаток: число выполнений} для запросов, выполненных больше одного раза (например, N+1)"""
+
+        return {fingerprint: count for fingerprint, count in self.fingerprints.most_common() if count > 1}
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Запросы к БД за запрос: число, время, повторяющиеся запросы и имя URL.
+    Пишутся в заголовок Server-Timing и строкой лога key=value (данные - в extra["sql"]); превышение
+    бюджета запросов (SQL_QUERY_BUDGETS по имени URL, иначе SQL_QUERY_BUDGET) - предупреждением.
+    Без SQL_INSTRUMENTATION middleware исключается из цепочки и ничего не стоит.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        url_name = request.resolver_match.view_name if request.resolver_match else None
+        budget = settings.SQL_QUERY_BUDGETS.get(url_name, settings.SQL_QUERY_BUDGET)
+        duplicates = recorder.get_duplicates()
+
+        server_timing = (
+            f'db;dur={recorder.duration * 1000:.2f};desc="queries={recorder.count} duplicates={len(duplicates)}", '
+            f"total;dur={duration * 1000:.2f}"
+        )
+        if response.has_header("Server-Timing"):
+            server_timing = f"{response['Server-Timing']}, {server_timing}"
+        response["Server-Timing"] = server_timing
+
+        data = {
+            "url_name": url_name,
+            "method": request.method,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "db_ms": round(recorder.duration * 1000, 2),
+            "total_ms": round(duration * 1000, 2),
+            "duplicates": duplicates,
+            "budget": budget,
+        }
+        if budget is not None and recorder.count > budget:
+            duplicated_sql = {fingerprint: recorder.samples[fingerprint] for fingerprint in duplicates}
+            logger.warning(
+                "SQL query budget exceeded: %s", format_fields(data), extra={"sql": {**data, "sql": duplicated_sql}}
+            )
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info("SQL: %s", format_fields(data), extra={"sql": data})
+        return response
+
+
+def format_fields(data):
+    """Поля в виде key=value через пробел, повторяющиеся запросы - отпечаток*число через запятую"""
+
+    fields = []
+    for key, value in data.items():
+        if isinstance(value, dict):
+            value = ",".join(f"{fingerprint}*{count}" for fingerprint, count in value.items())
+        fields.append(f"{key}={'-' if value is None or value == '' else value}")
+    return " ".join(fields)
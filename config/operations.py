@@ -0,0 +1,42 @@
+from django.contrib.postgres.operations import AddIndexConcurrently as BaseAddIndexConcurrently
+from django.db import migrations
+
+
+def is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == "postgresql"
+
+
+class PostgreSQLOnlyMixin:
+    """Операция меняет схему только в PostgreSQL, состояние моделей - в любой базе"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if is_postgresql(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if is_postgresql(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class PostgreSQLRunSQL(PostgreSQLOnlyMixin, migrations.RunSQL):
+    """RunSQL с SQL, понятным только PostgreSQL (функции plpgsql, триггеры)"""
+
+
+class PostgreSQLAddIndex(PostgreSQLOnlyMixin, migrations.AddIndex):
+    """Индекс, которого нет в других базах (GIN и т.п.)"""
+
+
+class AddIndexConcurrently(BaseAddIndexConcurrently):
+    """CREATE INDEX CONCURRENTLY в PostgreSQL, обычный CREATE INDEX в других базах"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if is_postgresql(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if is_postgresql(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_simplejwt",
     "drf_yasg",
@@ -31,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.middleware.SQLInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -40,6 +42,19 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Учет запросов к БД на каждый запрос (config.middleware): заголовок Server-Timing, лог и бюджет запросов.
+# Бюджет - SQL_QUERY_BUDGETS по имени URL (например, {"education:course-list": 5}), иначе SQL_QUERY_BUDGET
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION") == "True"
+SQL_QUERY_BUDGET = 20
+SQL_QUERY_BUDGETS = {}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"config.middleware": {"handlers": ["console"], "level": "INFO", "propagate": False}},
+}
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -92,7 +107,7 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
     ),
-    "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework_simplejwt.authentication.JWTAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("users.authentication.StatelessJWTAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
@@ -101,17 +116,70 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=55),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
-    "UPDATE_LAST_LOGIN": True,
+    # last_login пишется через буфер (users.last_login) и сбрасывается в базу пачками
+    "UPDATE_LAST_LOGIN": False,
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.UserTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.UserTokenRefreshSerializer",
 }
 
+# Как часто (в секундах) StatelessJWTAuthentication перепроверяет, что пользователь активен
+STATELESS_AUTH_RECHECK = 60
+
+# Роли пользователей (группы): кеш между запросами и доверие claim "roles" из access-токена
+ROLES_CACHE_TIMEOUT = 60 * 60
+ROLES_FROM_TOKEN = os.getenv("ROLES_FROM_TOKEN") == "True"
+
+# Cache
+if os.getenv("LOCATION"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("LOCATION"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+COURSE_CACHE_TIMEOUT = 60 * 15
+
+# Уведомление об изменениях курса уходит, когда курс не менялся COURSE_NOTIFICATION_WINDOW,
+# но не позже COURSE_NOTIFICATION_MAX_DELAY после первого изменения (с точностью до COURSE_NOTIFICATION_CHECK_INTERVAL)
+COURSE_NOTIFICATION_WINDOW = timedelta(minutes=15)
+COURSE_NOTIFICATION_MAX_DELAY = timedelta(hours=4)
+COURSE_NOTIFICATION_CHECK_INTERVAL = timedelta(minutes=1)
+# Сколько адресов подписчиков уходит в одну задачу рассылки
+COURSE_NOTIFICATION_CHUNK_SIZE = 500
+
+# Буфер входов пользователей: Redis, общий для веб-процессов и воркеров Celery. Без него last_login
+# пишется при каждом входе; memory:// - буфер в памяти процесса, только для однопроцессного запуска и тестов
+LAST_LOGIN_BUFFER_URL = os.getenv("LOCATION")
+LAST_LOGIN_FLUSH_INTERVAL = timedelta(minutes=1)
+LAST_LOGIN_FLUSH_BATCH = 500
+
+# Пользователи, не заходившие дольше USER_INACTIVE_AFTER, отключаются пачками по USER_DISABLE_CHUNK_SIZE
+USER_INACTIVE_AFTER = timedelta(days=30)
+USER_DISABLE_CHUNK_SIZE = 1000
+
 CELERY_BEAT_SCHEDULE = {
     "disable_inactive_users": {
         "task": "users.tasks.disable_inactive_users",
         "schedule": timedelta(days=1),
     },
+    "flush_last_logins": {
+        "task": "users.tasks.flush_last_logins",
+        "schedule": LAST_LOGIN_FLUSH_INTERVAL,
+    },
     "check_payments": {
         "task": "users.tasks.check_payments",
-        "schedule": timedelta(hours=5),
+        "schedule": timedelta(hours=1),
+    },
+    "send_due_course_changes": {
+        "task": "edu.tasks.send_due_course_changes",
+        "schedule": COURSE_NOTIFICATION_CHECK_INTERVAL,
     },
 }
 
@@ -134,6 +202,30 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = "users.User"
 
 STRIPE_API_KEY = os.getenv("STRIPE_API_KEY")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_TIMEOUT = 10
+# Сверка платежей: число параллельных запросов к Stripe, ограничение запросов в секунду
+# (лимит Stripe - 100 в секунду, оставляем запас для оформления платежей) и размер пачки bulk_update
+STRIPE_CONCURRENCY = 8
+STRIPE_RATE_LIMIT = 25
+STRIPE_CHECK_CHUNK_SIZE = 200
+# Цены Stripe хранятся в StripePrice, кеш лишь снимает запрос к базе при оплате
+STRIPE_PRICE_CACHE_TIMEOUT = 60 * 60 * 24
+# Сколько последних платежей показывается в профиле пользователя (остальные - в списке платежей)
+PROFILE_PAYMENTS_LIMIT = 5
+# Через сколько секунд клиенту повторить запрос статуса платежа, пока ссылка на оплату не готова
+PAYMENT_STATUS_RETRY_AFTER = 1
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Оплата подтверждается вебхуком, check_payments лишь подбирает платежи, по которым вебхук не пришел
+# за STRIPE_CHECK_STALE_AFTER; сессии Stripe истекают за сутки, поэтому старше STRIPE_CHECK_MAX_AGE не проверяются
+STRIPE_CHECK_STALE_AFTER = timedelta(hours=1)
+STRIPE_CHECK_MAX_AGE = timedelta(days=2)
+
+
+# Базовая линия бенчмарков (python3 manage.py bench --save) и допустимое замедление p50 относительно нее.
+# Время зависит от машины: базовую линию записывают там же, где потом сравнивают; число запросов сравнивается строго
+BENCH_BASELINE_PATH = BASE_DIR / "bench_baseline.json"
+BENCH_TOLERANCE = 0.5
 
 
 # Email
@@ -0,0 +1,262 @@
+import gc
+import json
+import re
+import statistics
+import time
+import timeit
+from functools import partial
+from itertools import cycle
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from edu.models import Course, Lesson, Subscription
+from edu.serializers import CourseSerializer
+from edu.service import update_course
+from edu.tasks import notify_course_subscribers, send_email_about_course_update
+from edu.validators import YoutubeOnly
+from edu.views import CourseViewSet, SubscriptionAPIView
+from users.generators import FillGenerator, reset_sequences, write_rows
+from users.models import Payment, User
+from users.serializers import PaymentSerializer, UserModeratorSerializer
+from users.views import get_user_queryset
+
+BENCH_LINKS = (
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "http://youtu.be/dQw4w9WgXcQ?t=42",
+    "https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg",
+    "HTTPS://m.youtube.com/shorts/abc",
+)
+BENCH_WORDS = "Разбираем пример из лекции, затем смотрим запись семинара и выполняем домашнее задание".split()
+
+
+def make_description(size):
+    """Описание урока примерно из size символов: после каждых 15 слов - ссылка на YouTube."""
+
+    parts, length = [], 0
+    words, links = cycle(BENCH_WORDS), cycle(BENCH_LINKS)
+    while length < size:
+        part = next(links) if len(parts) % 16 == 15 else next(words)
+        parts.append(part)
+        length += len(part) + 1
+    return " ".join(parts)
+
+
+def legacy_youtube_only(data, fields, allow_domains=("youtube.com", "youtube.ru", "googlevideo.com", "ytimg.com")):
+    """
+    Прежняя проверка YoutubeOnly (re.split без компиляции, список доменов) - база для сравнения.
+    Поддомены она отвергает, поэтому здесь проходит все ссылки и возвращает отвергнутые домены.
+    """
+
+    rejected = []
+    for key, value in data.items():
+        if key not in fields:
+            continue
+        domains = re.split(r"[hH][tT][tT][pP][sS]?://", value)
+        for word in domains[1:]:
+            domain = word.split(" ")[0].split("/")[0]
+            if domain not in allow_domains:
+                rejected.append(domain)
+    return rejected
+
+
+def bench_youtube_only(size, number=200):
+    """Время одной проверки описания из size символов (мкс): прежняя и текущая реализации."""
+
+    fields = ("name", "description")
+    data = {"name": "Урок", "description": make_description(size)}
+    validator = YoutubeOnly(fields=fields)
+    return {
+        "size": len(data["description"]),
+        "legacy_us": timeit.timeit(lambda: legacy_youtube_only(data, fields), number=number) / number * 1e6,
+        "current_us": timeit.timeit(lambda: validator(data), number=number) / number * 1e6,
+    }
+
+
+# Размеры данных набора бенчмарков (см. seed_benchmarks)
+BENCH_SEED = {"users": 10000, "courses": 20, "lessons": 200, "payments": 20000, "seed": 0}
+BENCH_WARMUP = 3
+
+
+def seed_benchmarks():
+    """Данные для бенчмарков: синтетические пользователи, курсы, уроки и платежи (см. users.generators)"""
+
+    generator = FillGenerator(**BENCH_SEED)
+    generator.reserve_ids()
+    for model, fields, rows in generator.get_tables():
+        write_rows(model, fields, rows, batch_size=10000)
+    reset_sequences([User, Course, Lesson])
+    return generator
+
+
+def get_request(user, method="get", data=None):
+    request = getattr(APIRequestFactory(), method)("/", data, format="json")
+    force_authenticate(request, user=user)
+    return request
+
+
+def setup_course_serializer(data, lessons):
+    """Просмотр курса: запрос CourseViewSet (аннотации и уроки) и CourseSerializer"""
+
+    user = User.objects.get(pk=data.user_base)
+    course = Course.objects.create(name=f"bench course {lessons}", description=make_description(512))
+    Lesson.objects.bulk_create(
+        Lesson(name=f"bench lesson {i}", description=make_description(512), course=course) for i in range(lessons)
+    )
+    request = Request(get_request(user))
+    request.user = user
+    view = CourseViewSet(action="retrieve", request=request, format_kwarg=None)
+    return lambda: CourseSerializer(view.get_queryset().get(pk=course.pk), context={"request": request}).data
+
+
+def setup_youtube_only(data, size):
+    validator = YoutubeOnly(fields=("name", "description"))
+    values = {"name": "Урок", "description": make_description(size)}
+    return lambda: validator(values)
+
+
+def setup_update_course(data):
+    """update_course: обновление курса и запись изменения (сброс кеша и уведомление - после фиксации)"""
+
+    course = Course.objects.create(name="bench update course")
+    return lambda: update_course(course.pk, "Обновлена информация о курсе")
+
+
+def setup_notify_subscribers(data, subscribers):
+    """Рассылка подписчикам курса: чтение почты и разбиение на пачки (задачи не ставятся, см. run_benchmarks)"""
+
+    course = Course.objects.create(name=f"bench notify course {subscribers}")
+    Subscription.objects.bulk_create(
+        Subscription(user_id=data.user_base + i, course=course) for i in range(subscribers)
+    )
+
+    return lambda: notify_course_subscribers(course.pk, "Курс обновлен", "Изменения в курсе")
+
+
+def setup_subscription_toggle(data):
+    """Подписка и отписка через SubscriptionAPIView"""
+
+    user = User.objects.get(pk=data.user_base)
+    course = Course.objects.create(name="bench subscription course")
+    view = SubscriptionAPIView.as_view()
+
+    def run():
+        view(get_request(user, "post", {"course": course.pk}))
+        view(get_request(user, "post", {"course": course.pk}))
+
+    return run
+
+
+def setup_payment_serializer(data, payments):
+    """Страница списка платежей: запрос и PaymentSerializer"""
+
+    return lambda: PaymentSerializer(Payment.objects.order_by("-date", "-id")[:payments], many=True).data
+
+
+def setup_user_payments_serializer(data, users):
+    """Страница профилей для модератора: последние платежи и итоги по платежам"""
+
+    return lambda: UserModeratorSerializer(
+        get_user_queryset(User.objects.all(), UserModeratorSerializer, None)[:users], many=True
+    ).data
+
+
+def get_benchmarks():
+    """{имя: setup(data) -> функция, время которой измеряется}; имена - ключи базовой линии"""
+
+    benchmarks = {}
+    for lessons in (0, 10, 100):
+        benchmarks[f"course_serializer[lessons={lessons}]"] = partial(setup_course_serializer, lessons=lessons)
+    for size in (4096, 65536):
+        benchmarks[f"youtube_only[size={size}]"] = partial(setup_youtube_only, size=size)
+    benchmarks["update_course"] = setup_update_course
+    for subscribers in (100, 10000):
+        benchmarks[f"notify_subscribers[subscribers={subscribers}]"] = partial(
+            setup_notify_subscribers, subscribers=subscribers
+        )
+    benchmarks["subscription_toggle"] = setup_subscription_toggle
+    benchmarks["payment_serializer[payments=100]"] = partial(setup_payment_serializer, payments=100)
+    benchmarks["user_payments_serializer[users=20]"] = partial(setup_user_payments_serializer, users=20)
+    return benchmarks
+
+
+def measure(func, number, warmup=BENCH_WARMUP):
+    """Операций в секунду, p50 и p99 одного вызова (мс) и число запросов к БД за вызов"""
+
+    for _ in range(warmup):
+        func()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+
+    # Как timeit: сборка мусора во время замеров отключена, чтобы не добавлять случайные паузы
+    times = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(max(number, 2)):
+            started = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - started)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    percentiles = statistics.quantiles(times, n=100, method="inclusive")
+    return {
+        "ops": round(len(times) / sum(times), 1),
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "queries": len(queries),
+    }
+
+
+def run_benchmarks(number=100, names=None):
+    """
+    Запускает бенчмарки (все или с именами, начинающимися на одно из names) на засеянной базе.
+    Все изменения делаются в транзакции и откатываются, поэтому набор можно запускать на любой базе.
+    """
+
+    results = {}
+    # Рассылка измеряется без постановки задач в брокер
+    with transaction.atomic(), mock.patch.object(send_email_about_course_update, "delay"):
+        data = seed_benchmarks()
+        for name, setup in get_benchmarks().items():
+            if names and not name.startswith(tuple(names)):
+                continue
+            results[name] = measure(setup(data), number)
+        transaction.set_rollback(True)
+    return results
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, ensure_ascii=False, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def compare(results, baseline, tolerance=None):
+    """
+    Регрессии относительно базовой линии: больше запросов к БД или, если задан tolerance,
+    p50 медленнее больше чем на эту долю. Время зависит от машины, число запросов - нет.
+    """
+
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["queries"] > expected["queries"]:
+            regressions.append(f"{name}: запросов {result['queries']}, было {expected['queries']}")
+        if tolerance is not None and result["p50_ms"] > expected["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {result['p50_ms']} мс, было {expected['p50_ms']} мс")
+    return regressions
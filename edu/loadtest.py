@@ -0,0 +1,284 @@
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+from random import Random
+
+import requests
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.urls import reverse
+
+from edu.models import Course, Lesson
+from edu.paginators import ResultsSetPagination
+from users.generators import FillGenerator, reset_sequences, write_rows
+from users.models import TRANSFER, User
+
+# Границы корзин гистограммы задержек, мс (последняя корзина - все, что медленнее)
+LOAD_HISTOGRAM_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Сценарии и их доли в нагрузке по умолчанию
+LOAD_MIX = {"browse": 50, "lesson": 30, "subscribe": 15, "pay": 5}
+# Сколько курсов создается, если в базе их нет, сколько id курсов берется для случайного выбора
+# и сколько уроков создается пользователю без своих уроков
+LOAD_COURSES = 20
+LOAD_SAMPLE_SIZE = 1000
+LOAD_USER_LESSONS = 5
+LOAD_TIMEOUT = 30
+# Сценарий browse открывает одну из первых LOAD_BROWSE_PAGES страниц списка курсов
+LOAD_BROWSE_PAGES = 3
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def get_free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def start_wsgi_server(host="127.0.0.1"):
+    """Приложение config.wsgi в многопоточном WSGI-сервере Django (как runserver). Возвращает (url, stop)"""
+
+    from config.wsgi import application
+
+    server = ThreadedWSGIServer((host, 0), QuietWSGIRequestHandler, allow_reuse_address=False)
+    server.set_app(application)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    return f"http://{host}:{server.server_address[1]}", stop
+
+
+def start_asgi_server(host="127.0.0.1"):
+    """Приложение config.asgi в uvicorn (нужно установить отдельно). Возвращает (url, stop)"""
+
+    import uvicorn
+
+    port = get_free_port(host)
+    server = uvicorn.Server(uvicorn.Config("config.asgi:application", host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn не запустился")
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+
+    return f"http://{host}:{port}", stop
+
+
+def prepare_data(users, password="password", seed=0):
+    """
+    Пользователи для входа (fill*@example.com с паролем password, см. команду fill), курсы и их уроки.
+    Урок видят только владелец и модератор, поэтому у каждого пользователя есть хотя бы LOAD_USER_LESSONS своих.
+    Недостающее добавляется. Возвращает ({почта: id уроков пользователя}, id курсов).
+    """
+
+    emails = list(
+        User.objects.filter(email__startswith="fill", email__endswith="@example.com", is_active=True)
+        .order_by("id")
+        .values_list("email", flat=True)[:users]
+    )
+    courses = 0 if Course.objects.exists() else LOAD_COURSES
+    generator = FillGenerator(users=users - len(emails), courses=courses, seed=seed, password=password)
+    if generator.users or generator.courses:
+        generator.reserve_ids()
+        for model, fields, rows in generator.get_tables():
+            write_rows(model, fields, rows, batch_size=10000)
+        reset_sequences([User, Course, Lesson])
+        emails += [
+            f"fill{user_id}@example.com"
+            for user_id in range(generator.user_base, generator.user_base + generator.users)
+        ]
+
+    course_ids = list(Course.objects.order_by("-id").values_list("id", flat=True)[:LOAD_SAMPLE_SIZE])
+    owners = dict(User.objects.filter(email__in=emails).values_list("id", "email"))
+    lessons = defaultdict(list)
+    for lesson_id, owner_id in Lesson.objects.filter(owner__in=owners).values_list("id", "owner_id"):
+        lessons[owners[owner_id]].append(lesson_id)
+
+    rng = Random(f"{seed}:lessons")
+    new_lessons = Lesson.objects.bulk_create(
+        Lesson(
+            name=f"Урок {i + 1}", description="Нагрузочный тест", course_id=rng.choice(course_ids), owner_id=owner_id
+        )
+        for owner_id, email in owners.items()
+        if not lessons[email] and course_ids
+        for i in range(LOAD_USER_LESSONS)
+    )
+    for lesson in new_lessons:
+        lessons[owners[lesson.owner_id]].append(lesson.pk)
+    return {email: lessons[email] for email in emails}, course_ids
+
+
+class Stats:
+    """Задержки (с), коды ответов и ошибки по имени URL. У каждого потока свой экземпляр, в конце они объединяются"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def add(self, url_name, latency, status):
+        self.latencies[url_name].append(latency)
+        self.statuses[url_name][status] += 1
+
+    def merge(self, other):
+        for url_name, latencies in other.latencies.items():
+            self.latencies[url_name] += latencies
+            self.statuses[url_name].update(other.statuses[url_name])
+
+    def get_summary(self, elapsed):
+        """Сводка по именам URL: запросов в секунду, доля ошибок, перцентили и гистограмма задержек (мс)"""
+
+        summary = {}
+        for url_name, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latency * 1000 for latency in latencies)
+            statuses = self.statuses[url_name]
+            errors = sum(count for status, count in statuses.items() if status == "error" or int(status) >= 400)
+            histogram = Counter(
+                next((f"<={bucket}" for bucket in LOAD_HISTOGRAM_BUCKETS if latency <= bucket), "inf")
+                for latency in latencies
+            )
+            summary[url_name] = {
+                "requests": len(latencies),
+                "rps": round(len(latencies) / elapsed, 1) if elapsed else 0,
+                "error_rate": round(errors / len(latencies), 4),
+                "p50_ms": round(get_percentile(latencies, 50), 2),
+                "p95_ms": round(get_percentile(latencies, 95), 2),
+                "p99_ms": round(get_percentile(latencies, 99), 2),
+                "max_ms": round(latencies[-1], 2),
+                "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+                "histogram": {
+                    bucket: histogram[bucket]
+                    for bucket in [f"<={bucket}" for bucket in LOAD_HISTOGRAM_BUCKETS] + ["inf"]
+                    if histogram[bucket]
+                },
+            }
+        return summary
+
+
+def get_percentile(values, percent):
+    """Перцентиль отсортированного списка (ближайший ранг)"""
+
+    return values[max(0, min(len(values) - 1, round(len(values) * percent / 100) - 1))]
+
+
+class VirtualUser:
+    """Пользователь нагрузки: входит через users:login и выполняет сценарии в своем потоке"""
+
+    def __init__(self, base_url, email, password, course_ids, lesson_ids, rng):
+        self.base_url = base_url
+        self.email, self.password = email, password
+        self.course_ids, self.lesson_ids = course_ids, lesson_ids
+        self.rng = rng
+        self.session = requests.Session()
+        self.stats = Stats()
+
+    def request(self, method, url_name, args=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + reverse(url_name, args=args), timeout=LOAD_TIMEOUT, **kwargs
+            )
+        except requests.RequestException:
+            self.stats.add(url_name, time.perf_counter() - started, "error")
+            return None
+        self.stats.add(url_name, time.perf_counter() - started, response.status_code)
+        return response
+
+    def login(self):
+        response = self.request("post", "users:login", json={"email": self.email, "password": self.password})
+        if response is None or response.status_code != 200:
+            return False
+        self.session.headers["Authorization"] = f"Bearer {response.json()['access']}"
+        return True
+
+    def browse(self):
+        """Список курсов (одна из первых страниц) и просмотр курса"""
+
+        pages = min(LOAD_BROWSE_PAGES, -(-len(self.course_ids) // ResultsSetPagination.page_size))
+        self.request("get", "education:course-list", params={"page": self.rng.randint(1, pages)})
+        self.request("get", "education:course-detail", args=(self.rng.choice(self.course_ids),))
+
+    def lesson(self):
+        """Просмотр своего урока"""
+
+        self.request("get", "education:detail-lesson", args=(self.rng.choice(self.lesson_ids),))
+
+    def subscribe(self):
+        self.request("post", "education:course-subscription", json={"course": self.rng.choice(self.course_ids)})
+
+    def pay(self):
+        course = self.rng.choice(self.course_ids)
+        self.request("post", "users:payments-create", json={"course": course, "amount": 990, "method": TRANSFER})
+
+    def run(self, mix, start, duration):
+        scenarios, weights = zip(*mix.items())
+        start.wait()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            getattr(self, self.rng.choices(scenarios, weights=weights)[0])()
+        self.session.close()
+
+
+def run_load(base_url, lessons, password, course_ids, duration, mix=None, seed=0):
+    """
+    Нагрузка на base_url: по потоку на пользователя из lessons ({почта: id его уроков}), сценарии выбираются случайно с весами mix.
+    Сначала все входят, затем одновременно выполняют сценарии duration секунд.
+    Возвращает (сводка входов, сводка нагрузки) - см. Stats.get_summary.
+    """
+
+    mix = {name: weight for name, weight in (mix or LOAD_MIX).items() if weight}
+    users = [
+        VirtualUser(base_url, email, password, course_ids, lesson_ids, Random(f"{seed}:{i}"))
+        for i, (email, lesson_ids) in enumerate(lessons.items())
+    ]
+
+    started = time.monotonic()
+    logged_in = run_threads([user.login for user in users])
+    login_stats = Stats()
+    for user in users:
+        login_stats.merge(user.stats)
+        user.stats = Stats()
+    login_elapsed = time.monotonic() - started
+
+    users = [user for user, ok in zip(users, logged_in) if ok]
+    start = threading.Barrier(len(users) + 1)
+    threads = [threading.Thread(target=user.run, args=(mix, start, duration)) for user in users]
+    for thread in threads:
+        thread.start()
+    if users:
+        start.wait()
+    started = time.monotonic()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    stats = Stats()
+    for user in users:
+        stats.merge(user.stats)
+    return login_stats.get_summary(login_elapsed), stats.get_summary(elapsed)
+
+
+def run_threads(funcs):
+    """Выполняет функции в отдельных потоках, возвращает их результаты по порядку"""
+
+    results = [None] * len(funcs)
+
+    def run(i):
+        results[i] = funcs[i]()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(funcs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from edu.benchmarks import bench_youtube_only, compare, load_baseline, run_benchmarks, save_baseline
+
+
+class Command(BaseCommand):
+    """
+    Набор микробенчмарков (сериализаторы, валидаторы, сервисы) на засеянной базе: операций в секунду,
+    p50/p99 и число запросов. Сравнивается с базовой линией BENCH_BASELINE_PATH и завершается ошибкой
+    при регрессии; --save записывает текущие результаты как новую базовую линию.
+    --legacy: сравнение прежней и текущей проверки ссылок YoutubeOnly на описаниях разного размера.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", nargs="+", help="Только бенчмарки с такими префиксами имен")
+        parser.add_argument("--number", type=int, default=100, help="Повторов на замер")
+        parser.add_argument("--baseline", default=settings.BENCH_BASELINE_PATH, help="Файл базовой линии")
+        parser.add_argument("--save", action="store_true", help="Записать результаты как базовую линию")
+        parser.add_argument(
+            "--tolerance", type=float, default=settings.BENCH_TOLERANCE, help="Допустимое замедление p50 (доля)"
+        )
+        parser.add_argument("--queries-only", action="store_true", help="Сравнивать только число запросов")
+        parser.add_argument("--legacy", action="store_true", help="Сравнить прежнюю и текущую YoutubeOnly")
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4096, 16384], help="Размеры описаний")
+
+    def handle(self, *args, **options) -> str | None:
+        if options["legacy"]:
+            return self.handle_legacy(options)
+
+        baseline = load_baseline(options["baseline"])
+        results = run_benchmarks(number=options["number"], names=options["only"])
+
+        print(f"{'бенчмарк':<40} {'оп/с':>10} {'p50, мс':>10} {'p99, мс':>10} {'запросов':>9} {'p50 к базе':>11}")
+        for name, result in results.items():
+            expected = baseline.get(name)
+            change = f"{result['p50_ms'] / expected['p50_ms'] - 1:+.0%}" if expected else "-"
+            print(
+                f"{name:<40} {result['ops']:>10.1f} {result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f} "
+                f"{result['queries']:>9} {change:>11}"
+            )
+
+        if options["save"]:
+            save_baseline(options["baseline"], {**baseline, **results})
+            print(f"Базовая линия записана: {options['baseline']}")
+            return
+
+        tolerance = None if options["queries_only"] else options["tolerance"]
+        regressions = compare(results, baseline, tolerance=tolerance)
+        if regressions:
+            raise CommandError("Регрессии:\n" + "\n".join(regressions))
+
+    def handle_legacy(self, options):
+        print(f"{'размер':>8} {'прежняя, мкс':>14} {'текущая, мкс':>14} {'ускорение':>10}")
+        for size in options["sizes"]:
+            result = bench_youtube_only(size, number=options["number"])
+            speedup = result["legacy_us"] / result["current_us"]
+            print(f"{result['size']:>8} {result['legacy_us']:>14.1f} {result['current_us']:>14.1f} {speedup:>9.1f}x")
@@ -0,0 +1,103 @@
+import json
+from functools import partial
+
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from edu.loadtest import LOAD_MIX, prepare_data, run_load, start_asgi_server, start_wsgi_server
+from users.stripe_stub import FakeStripeServer
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест API по HTTP: запускает config.wsgi (или config.asgi с --asgi) в этом процессе
+    с заглушкой Stripe, входит синтетическими пользователями через users:login и --duration секунд
+    выполняет смесь сценариев с --concurrency потоками. Выводит пропускную способность, долю ошибок,
+    перцентили и гистограммы задержек по именам URL.
+    С --url нагрузка идет на уже запущенный сервер (например, gunicorn с нужным числом воркеров);
+    оплата тогда обращается к Stripe, указанному в его STRIPE_API_BASE.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=10, help="Одновременных пользователей (потоков)")
+        parser.add_argument("--duration", type=float, default=30, help="Длительность нагрузки, с")
+        parser.add_argument(
+            "--mix",
+            nargs="+",
+            default=[f"{name}={weight}" for name, weight in LOAD_MIX.items()],
+            help=f"Веса сценариев ({', '.join(LOAD_MIX)}), например browse=70 pay=0",
+        )
+        parser.add_argument("--asgi", action="store_true", help="Запустить config.asgi в uvicorn вместо WSGI")
+        parser.add_argument("--url", help="Адрес уже запущенного сервера вместо запуска приложения")
+        parser.add_argument("--password", default="password", help="Пароль синтетических пользователей")
+        parser.add_argument("--seed", type=int, default=0, help="Зерно выбора сценариев и данных")
+        parser.add_argument("--json", help="Записать сводку в JSON-файл")
+
+    def handle(self, *args, **options) -> str | None:
+        mix = self.parse_mix(options["mix"])
+        lessons, course_ids = prepare_data(options["concurrency"], options["password"], options["seed"])
+        load = partial(
+            run_load,
+            lessons=lessons,
+            password=options["password"],
+            course_ids=course_ids,
+            duration=options["duration"],
+            mix=mix,
+            seed=options["seed"],
+        )
+        if options["url"]:
+            login, summary = load(options["url"].rstrip("/"))
+        else:
+            login, summary = self.run_local(load, asgi=options["asgi"])
+
+        self.print_summary("Вход", login)
+        self.print_summary("Нагрузка", summary)
+        if options["json"]:
+            with open(options["json"], "w", encoding="utf-8") as file:
+                json.dump({"login": login, "load": summary}, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def run_local(load, asgi=False):
+        """Приложение и заглушка Stripe в этом процессе"""
+
+        if asgi:
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError("Для --asgi нужен uvicorn: pip install uvicorn")
+
+        with FakeStripeServer() as stripe_stub, override_settings(
+            ALLOWED_HOSTS=["127.0.0.1"], STRIPE_API_BASE=stripe_stub.url, STRIPE_API_KEY="sk_test_load"
+        ):
+            base_url, stop = start_asgi_server() if asgi else start_wsgi_server()
+            try:
+                return load(base_url)
+            finally:
+                stop()
+
+    @staticmethod
+    def parse_mix(values):
+        mix = dict(LOAD_MIX)
+        for value in values:
+            name, _, weight = value.partition("=")
+            if name not in LOAD_MIX or not weight.isdigit():
+                raise CommandError(f"Неверный вес сценария: {value}")
+            mix[name] = int(weight)
+        if not any(mix.values()):
+            raise CommandError("Все веса сценариев нулевые")
+        return mix
+
+    @staticmethod
+    def print_summary(title, summary):
+        print(f"\n{title}")
+        print(f"{'URL':<34} {'запросов':>9} {'в сек.':>8} {'ошибки':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+        for url_name, result in summary.items():
+            print(
+                f"{url_name:<34} {result['requests']:>9} {result['rps']:>8.1f} {result['error_rate']:>7.1%} "
+                f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}"
+            )
+        total = sum(result["requests"] for result in summary.values())
+        print(f"{'всего':<34} {total:>9} {sum(result['rps'] for result in summary.values()):>8.1f}")
+        for url_name, result in summary.items():
+            histogram = ", ".join(f"{bucket}: {count}" for bucket, count in result["histogram"].items())
+            print(f"  {url_name} мс: {histogram}")
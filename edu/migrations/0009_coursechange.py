@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 08:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("edu", "0008_alter_course_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseChange",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("description", models.CharField(max_length=255, verbose_name="Описание изменения")),
+                (
+                    "created_at",
+                    models.DateTimeField(default=django.utils.timezone.now, verbose_name="Время изменения"),
+                ),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="changes", to="edu.course"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Изменение курса",
+                "verbose_name_plural": "Изменения курсов",
+                "ordering": ["id"],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 08:05
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_subscriptions(apps, schema_editor):
+    Subscription = apps.get_model("edu", "Subscription")
+    subscriptions = Subscription.objects.using(schema_editor.connection.alias)
+    first_ids = subscriptions.values("user", "course").annotate(first_id=Min("id")).values("first_id")
+    subscriptions.exclude(id__in=first_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("edu", "0009_coursechange"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_subscriptions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="subscription",
+            constraint=models.UniqueConstraint(fields=("user", "course"), name="unique_subscription"),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2 on 2026-10-18 08:29
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from config.operations import PostgreSQLAddIndex, PostgreSQLRunSQL, is_postgresql
+
+
+# search_vector по названию (вес A) и описанию (вес B) в русской и английской конфигурациях.
+# Поддерживается триггером, поэтому остается актуальным и при bulk_create/bulk_update/update()
+SEARCH_VECTOR_SQL = """
+CREATE FUNCTION edu_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER edu_course_search_vector BEFORE INSERT OR UPDATE OF name, description ON edu_course
+    FOR EACH ROW EXECUTE FUNCTION edu_search_vector_update();
+CREATE TRIGGER edu_lesson_search_vector BEFORE INSERT OR UPDATE OF name, description ON edu_lesson
+    FOR EACH ROW EXECUTE FUNCTION edu_search_vector_update();
+
+UPDATE edu_course SET name = name;
+UPDATE edu_lesson SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP TRIGGER edu_course_search_vector ON edu_course;
+DROP TRIGGER edu_lesson_search_vector ON edu_lesson;
+DROP FUNCTION edu_search_vector_update();
+"""
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    Триграммные индексы по названиям для поиска с опечатками. pg_trgm входит в contrib PostgreSQL,
+    но может быть не установлен - тогда поиск идет только по search_vector (edu.service.search).
+    """
+
+    if not is_postgresql(schema_editor):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute("CREATE INDEX course_name_trgm_idx ON edu_course USING gin (name gin_trgm_ops)")
+    schema_editor.execute("CREATE INDEX lesson_name_trgm_idx ON edu_lesson USING gin (name gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if not is_postgresql(schema_editor):
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS course_name_trgm_idx")
+    schema_editor.execute("DROP INDEX IF EXISTS lesson_name_trgm_idx")
+
+
+# Триггер и индексы есть только в PostgreSQL; в других базах search_vector остается пустым,
+# а поиск идет через icontains (edu.service.search)
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("edu", "0010_subscription_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="lesson",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        PostgreSQLRunSQL(SEARCH_VECTOR_SQL, DROP_SEARCH_VECTOR_SQL),
+        PostgreSQLAddIndex(
+            model_name="course",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="course_search_vector_idx"),
+        ),
+        PostgreSQLAddIndex(
+            model_name="lesson",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="lesson_search_vector_idx"),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
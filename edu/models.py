@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 
@@ -7,17 +9,32 @@ from config import settings
 NULLABLE = {"blank": True, "null": True}
 
 
+class SearchVectorManager(models.Manager):
+    """
+    search_vector (tsvector по названию и описанию) поддерживается триггером в базе
+    и нужен только поиску, поэтому по умолчанию не загружается.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer("search_vector")
+
+
 class Course(models.Model):
     name = models.CharField(verbose_name="Название", max_length=150)
     description = models.TextField(verbose_name="Описание", **NULLABLE)
     preview = models.ImageField(verbose_name="Превью", upload_to="courses", **NULLABLE)
     owner = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, **NULLABLE)
     updated_at = models.DateTimeField(verbose_name="Время последнего изменения", default=timezone.now)
+    search_vector = SearchVectorField(editable=False, null=True)
+
+    objects = SearchVectorManager()
 
     class Meta:
         verbose_name = "Курс"
         verbose_name_plural = "Курсы"
         ordering = ["-id"]
+        # Триграммный индекс по названию (course_name_trgm_idx) создается миграцией, если доступен pg_trgm
+        indexes = [GinIndex(fields=["search_vector"], name="course_search_vector_idx")]
 
     def __str__(self):
         return self.name
@@ -30,11 +47,16 @@ class Lesson(models.Model):
     video_url = models.CharField(verbose_name="Ссылка на видео", max_length=200, **NULLABLE)
     course = models.ForeignKey(to=Course, related_name="lessons", on_delete=models.CASCADE)
     owner = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, **NULLABLE)
+    search_vector = SearchVectorField(editable=False, null=True)
+
+    objects = SearchVectorManager()
 
     class Meta:
         verbose_name = "Урок"
         verbose_name_plural = "Уроки"
         ordering = ["-id"]
+        # Триграммный индекс по названию (lesson_name_trgm_idx) создается миграцией, если доступен pg_trgm
+        indexes = [GinIndex(fields=["search_vector"], name="lesson_search_vector_idx")]
 
     def __str__(self):
         return self.name
@@ -43,3 +65,24 @@ class Lesson(models.Model):
 class Subscription(models.Model):
     user = models.ForeignKey(to=settings.AUTH_USER_MODEL, related_name="subscriptions", on_delete=models.CASCADE)
     course = models.ForeignKey(to=Course, related_name="subscriptions", on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "course"], name="unique_subscription"),
+        ]
+
+
+class CourseChange(models.Model):
+    """Изменение курса, ожидающее отправки уведомления подписчикам."""
+
+    course = models.ForeignKey(to=Course, related_name="changes", on_delete=models.CASCADE)
+    description = models.CharField(verbose_name="Описание изменения", max_length=255)
+    created_at = models.DateTimeField(verbose_name="Время изменения", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Изменение курса"
+        verbose_name_plural = "Изменения курсов"
+        ordering = ["id"]
+
+    def __str__(self):
+        return self.description
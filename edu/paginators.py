@@ -1,7 +1,193 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
 
 
 class ResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 20
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Пагинация по ключу (keyset): каждая страница - это диапазон по индексу,
+    без COUNT(*) и OFFSET, поэтому стоимость не зависит от глубины.
+    Позиция курсора хранит значения всех полей сортировки, последним полем всегда идет pk,
+    поэтому позиция уникальна и допускаются NULL в остальных полях. Место NULL задается
+    в ORDER BY явно (по убыванию - первыми, по возрастанию - последними), поэтому
+    сортировка и условие курсора совпадают в любой базе.
+    """
+
+    ordering = ("-id",)
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 20
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view))
+        if ordering[-1].lstrip("-") not in ("pk", "id"):
+            ordering.append("-id" if ordering[-1].startswith("-") else "id")
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor.reverse, self.cursor.position
+
+        ordering = self._reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*self._get_order_by(ordering))
+        if current_position is not None:
+            queryset = queryset.filter(self._get_position_filter(queryset.model, ordering, current_position))
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else self.next_position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = (
+            self._get_position_from_instance(self.page[0], self.ordering) if self.page else self.previous_position
+        )
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+    def encode_cursor(self, cursor):
+        if cursor.position is not None:
+            cursor = cursor._replace(position=json.dumps(cursor.position))
+        return super().encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for order in ordering:
+            field_name = order.lstrip("-")
+            attr = instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)
+            position.append(None if attr is None else str(attr))
+        return position
+
+    @staticmethod
+    def _get_order_by(ordering):
+        """Сортировка с явным местом NULL: как в PostgreSQL (NULL больше любого значения)"""
+
+        return [
+            F(order[1:]).desc(nulls_first=True) if order.startswith("-") else F(order).asc(nulls_last=True)
+            for order in ordering
+        ]
+
+    @staticmethod
+    def _reverse_ordering(ordering):
+        return tuple(order[1:] if order.startswith("-") else f"-{order}" for order in ordering)
+
+    def _get_position_filter(self, model, ordering, position):
+        """Условие "строго после позиции" для сортировки ordering (лексикографически по полям)."""
+
+        condition = Q()
+        equal = Q()
+        for order, value in zip(ordering, position):
+            field_name = order.lstrip("-")
+            try:
+                nullable = (model._meta.pk if field_name == "pk" else model._meta.get_field(field_name)).null
+            except FieldDoesNotExist:
+                # Аннотация (например, rank поиска) - без NULL
+                nullable = False
+            after = None
+            if order.startswith("-"):
+                # По убыванию NULL идут первыми
+                if value is None:
+                    after = Q(**{f"{field_name}__isnull": False})
+                else:
+                    after = Q(**{f"{field_name}__lt": value})
+            elif value is not None:
+                # По возрастанию NULL идут последними
+                after = Q(**{f"{field_name}__gt": value})
+                if nullable:
+                    after |= Q(**{f"{field_name}__isnull": True})
+
+            if after is not None:
+                condition |= equal & after
+            if value is None:
+                equal &= Q(**{f"{field_name}__isnull": True})
+            else:
+                equal &= Q(**{field_name: value})
+        return condition
+
+
+class SearchPagination(KeysetPagination):
+    """Результаты поиска: по убыванию релевантности (аннотация rank), затем по id."""
+
+    ordering = ("-rank", "-id")
+
+
+class PaginationModeMixin:
+    """
+    Выбор пагинации на каждый запрос: ?pagination=cursor (или наличие cursor в запросе)
+    включает пагинацию по ключу, иначе используется pagination_class.
+    """
+
+    cursor_pagination_class = KeysetPagination
+    pagination_query_param = "pagination"
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.use_cursor_pagination():
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
+    def use_cursor_pagination(self):
+        request = getattr(self, "request", None)
+        if request is None:
+            return False
+        params = request.query_params
+        return (
+            params.get(self.pagination_query_param) == "cursor"
+            or self.cursor_pagination_class.cursor_query_param in params
+        )
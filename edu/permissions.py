@@ -1,11 +1,13 @@
 from rest_framework.permissions import BasePermission
 
+from users.roles import is_moderator
+
 
 class IsModerator(BasePermission):
     """Проверка на модератора."""
 
     def has_permission(self, request, view):
-        return request.user.groups.filter(name="moderators").exists()
+        return is_moderator(request)
 
 
 class IsOwner(BasePermission):
@@ -1,15 +1,62 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
 from edu.models import Course, Lesson, Subscription
 from edu.validators import YoutubeOnly
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class SparseFieldsetsMixin:
+    """
+    Разреженные наборы полей: ?fields=name,preview оставляет в ответе только перечисленные поля,
+    ?expand=lessons добавляет к ним вложенные поля. Без ?fields возвращается полное представление.
+    Список полей можно передать и явно: Serializer(..., fields=(...)).
+    """
+
+    fields_query_param = "fields"
+    expand_query_param = "expand"
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+
+        if fields is None:
+            fields = self.get_requested_fields(self.context.get("request"))
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        """Множество запрошенных полей или None, если нужно полное представление."""
+
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+
+        fields = cls._split_param(request.query_params.get(cls.fields_query_param))
+        if not fields:
+            return None
+        return fields | cls._split_param(request.query_params.get(cls.expand_query_param))
+
+    @classmethod
+    def get_model_fields(cls, fields):
+        """Поля модели среди запрошенных - для QuerySet.only()."""
+
+        names = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        return sorted(names & set(fields))
+
+    @staticmethod
+    def _split_param(value):
+        if not value:
+            return set()
+        return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class LessonSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """Сериализатор на уроки."""
 
     class Meta:
         model = Lesson
-        fields = "__all__"
+        exclude = ("search_vector",)
         validators = (
             YoutubeOnly(
                 fields=(
@@ -21,7 +68,45 @@ class LessonSerializer(serializers.ModelSerializer):
         )
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Связь по pk, которая берет объект из заранее загруженного словаря context[context_key]
+    вместо отдельного запроса на каждое значение.
+    """
+
+    def __init__(self, context_key, **kwargs):
+        self.context_key = context_key
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        objects = self.context.get(self.context_key)
+        if objects is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return objects[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class LessonBulkSerializer(LessonSerializer):
+    """
+    Сериализатор на элемент массовой загрузки уроков.
+    С id - редактирование существующего урока, без id - создание.
+    Курсы берутся из context["courses"].
+    """
+
+    id = serializers.IntegerField(required=False, allow_null=True)
+    course = PreloadedPrimaryKeyRelatedField(context_key="courses", queryset=Course.objects.all())
+
+    class Meta(LessonSerializer.Meta):
+        read_only_fields = ("owner",)
+
+
+class CourseSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Сериализатор на курсы.
     Дополнительное поле: количество уроков, относящихся к курсу.
@@ -45,19 +130,60 @@ class CourseSerializer(serializers.ModelSerializer):
         )
 
     def get_count_lessons(self, course):
+        # Аннотация из CourseViewSet.get_queryset, иначе (например, после создания) отдельный запрос
+        if hasattr(course, "lessons_count"):
+            return course.lessons_count
         return Lesson.objects.filter(course=course).count()
 
     def get_is_subscribed(self, course):
-        user = self.context["request"].user
-        if Subscription.objects.filter(course=course, user=user).exists():
+        if hasattr(course, "user_subscribed"):
+            subscribed = course.user_subscribed
+        else:
+            user = self.context["request"].user
+            subscribed = Subscription.objects.filter(course=course, user=user).exists()
+        return self.get_subscription_label(subscribed)
+
+    @staticmethod
+    def get_subscription_label(subscribed):
+        if subscribed:
             return "Вы подписаны"
         else:
             return "Вы не подписаны"
 
 
+class CourseSearchSerializer(serializers.ModelSerializer):
+    """Сериализатор результата поиска курсов."""
+
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ("id", "name", "description", "rank")
+
+
+class LessonSearchSerializer(serializers.ModelSerializer):
+    """Сериализатор результата поиска уроков."""
+
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Lesson
+        fields = ("id", "name", "description", "course", "rank")
+
+
 class SubscriptionSerializer(serializers.ModelSerializer):
     """Сериализатор на подписки."""
 
     class Meta:
         model = Subscription
         fields = ["course"]
+
+
+class SubscriptionBulkSerializer(serializers.Serializer):
+    """Сериализатор на массовую подписку/отписку."""
+
+    SUBSCRIBE = "subscribe"
+    UNSUBSCRIBE = "unsubscribe"
+
+    courses = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=100)
+    action = serializers.ChoiceField(choices=(SUBSCRIBE, UNSUBSCRIBE), default=SUBSCRIBE)
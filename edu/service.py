@@ -1,21 +1,81 @@
+from functools import lru_cache
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
 from django.utils import timezone
-from edu.models import Course, Subscription
-from edu.tasks import send_email_about_course_update
+
+from config import settings
+from edu.models import Course, CourseChange
+
+
+def get_course_cache_key(course_id):
+    return f"edu:course:{course_id}"
+
+
+def get_cached_course(course_id):
+    """Возвращает закешированные данные курса (без флага подписки) или None."""
+
+    return cache.get(get_course_cache_key(course_id))
+
+
+def set_cached_course(course_id, data):
+    """Кеширует данные курса, не зависящие от пользователя."""
+
+    cache.set(get_course_cache_key(course_id), {**data, "is_subscribed": None}, settings.COURSE_CACHE_TIMEOUT)
 
 
-def update_course(course_id):
+def invalidate_course_cache(course_id):
+    cache.delete(get_course_cache_key(course_id))
+
+
+def update_course(course_id, change="Курс обновлен"):
     """
-    Функция обновляет дату последнего изменения и запускает отправку емейлов подписчикам,
-    если с момента последнего изменения курса прошло более 4 часов.
+    Функция обновляет дату последнего изменения курса и записывает изменение.
+    Обе записи идут в текущей транзакции, а сброс кеша - только после ее фиксации,
+    поэтому откаченные изменения ни кеш, ни письма не затрагивают.
+    Подписчики получают одно письмо со списком изменений, когда курс не меняется
+    в течение COURSE_NOTIFICATION_WINDOW (см. send_due_course_changes).
     """
 
-    course = Course.objects.filter(pk=course_id).first()
-    previous_updated_at = course.updated_at
-    course.updated_at = timezone.now()
-    course.save(update_fields=["updated_at"])
+    now = timezone.now()
+    Course.objects.filter(pk=course_id).update(updated_at=now)
+    CourseChange.objects.create(course_id=course_id, description=change, created_at=now)
+
+    transaction.on_commit(lambda: invalidate_course_cache(course_id))
+
+
+@lru_cache
+def has_trigram_extension(alias):
+    """Установлен ли pg_trgm (миграция edu 0011 ставит его, только если расширение доступно)"""
+
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def search(queryset, query):
+    """
+    Полнотекстовый поиск по названию и описанию с оценкой релевантности в аннотации rank.
+    В PostgreSQL: search_vector @@ запрос (русская и английская конфигурации, GIN-индекс),
+    с pg_trgm - еще и похожее название (на случай опечаток); rank - ts_rank плюс сходство названия.
+    В других базах - icontains, название весит больше описания.
+    """
 
-    if course.updated_at - previous_updated_at > timezone.timedelta(seconds=4):
-        subscriptions = Subscription.objects.filter(course=course_id)
-        emails = [sub.user.email for sub in subscriptions]
+    if connections[queryset.db].vendor != "postgresql":
+        return queryset.annotate(
+            rank=Case(When(name__icontains=query, then=Value(1.0)), default=Value(0.5), output_field=FloatField())
+        ).filter(Q(name__icontains=query) | Q(description__icontains=query))
 
-        send_email_about_course_update.delay("Тема", "Письмо", emails)
+    search_query = SearchQuery(query, config="russian", search_type="websearch") | SearchQuery(
+        query, config="english", search_type="websearch"
+    )
+    rank = SearchRank(F("search_vector"), search_query)
+    search_filter = Q(search_vector=search_query)
+    if has_trigram_extension(queryset.db):
+        rank += TrigramSimilarity("name", query)
+        search_filter |= Q(name__trigram_similar=query)
+    # ts_rank возвращает real: в double precision значение точно переживает курсор пагинации (float в Python)
+    return queryset.annotate(rank=Cast(rank, FloatField())).filter(search_filter)
@@ -1,5 +1,13 @@
+from itertools import islice
+
 from celery import shared_task
+from django.conf import settings
 from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from edu.models import Course, CourseChange, Subscription
 
 
 @shared_task
@@ -12,3 +20,73 @@ def send_email_about_course_update(subject, body, emails):
     )
 
     email.send(fail_silently=False)
+
+
+@shared_task
+def notify_course_subscribers(course_id, subject, body):
+    """
+    Рассылка подписчикам курса.
+    Почта подписчиков читается из БД потоком и отправляется пачками по COURSE_NOTIFICATION_CHUNK_SIZE
+    отдельными задачами, поэтому память, размер сообщений брокера и время одной задачи не растут
+    с числом подписчиков.
+    """
+
+    chunk_size = settings.COURSE_NOTIFICATION_CHUNK_SIZE
+    emails = (
+        Subscription.objects.filter(course_id=course_id)
+        .order_by()
+        .values_list("user__email", flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+
+    chunks = 0
+    while chunk := list(islice(emails, chunk_size)):
+        send_email_about_course_update.delay(subject, body, chunk)
+        chunks += 1
+    return chunks
+
+
+@shared_task
+def send_due_course_changes():
+    """
+    Периодическая отправка накопленных изменений курсов (CELERY_BEAT_SCHEDULE).
+    Курс готов к отправке, если не менялся COURSE_NOTIFICATION_WINDOW или первое изменение
+    старше COURSE_NOTIFICATION_MAX_DELAY. Состояние хранится только в CourseChange,
+    поэтому отложенные задачи в брокере и общий кеш не нужны.
+    Возвращает количество отправленных изменений.
+    """
+
+    now = timezone.now()
+    due = (
+        CourseChange.objects.order_by()
+        .values("course_id")
+        .annotate(first=Min("created_at"), last=Max("created_at"))
+        .filter(
+            Q(last__lte=now - settings.COURSE_NOTIFICATION_WINDOW)
+            | Q(first__lte=now - settings.COURSE_NOTIFICATION_MAX_DELAY)
+        )
+        .values_list("course_id", flat=True)
+    )
+    return sum(send_course_changes(course_id) for course_id in list(due))
+
+
+@shared_task
+def send_course_changes(course_id):
+    """
+    Отправка накопленных изменений курса: изменения забираются под блокировкой и удаляются,
+    подписчики получают одно письмо со списком изменений. Параллельный запуск для того же курса
+    пропускает уже забранные изменения. Возвращает количество отправленных изменений.
+    """
+
+    with transaction.atomic():
+        claimed = list(CourseChange.objects.filter(course_id=course_id).select_for_update(skip_locked=True))
+        if not claimed:
+            return 0
+        CourseChange.objects.filter(pk__in=[change.pk for change in claimed]).delete()
+
+        course = Course.objects.get(pk=course_id)
+        descriptions = dict.fromkeys(change.description for change in claimed)
+        subject = f"Курс «{course.name}» обновлен"
+        body = "\n".join([f"Изменения в курсе «{course.name}»:", *(f"- {text}" for text in descriptions)])
+        transaction.on_commit(lambda: notify_course_subscribers.delay(course_id, subject, body))
+    return len(claimed)
@@ -12,9 +12,13 @@ router.register(r"courses", views.CourseViewSet)
 urlpatterns = [
     path("lessons/", views.LessonListAPIView.as_view(), name="list-lesson"),
     path("lessons/create/", views.LessonCreateAPIView.as_view(), name="create-lesson"),
+    path("lessons/bulk/", views.LessonBulkAPIView.as_view(), name="bulk-lesson"),
     path("lessons/<int:pk>/", views.LessonRetrieveAPIView.as_view(), name="detail-lesson"),
     path("lessons/update/<int:pk>/", views.LessonUpdateAPIView.as_view(), name="update-lesson"),
     path("lessons/delete/<int:pk>/", views.LessonDestroyAPIView.as_view(), name="destroy-lesson"),
     path("subscription/", views.SubscriptionAPIView.as_view(), name="course-subscription"),
+    path("subscription/bulk/", views.SubscriptionBulkAPIView.as_view(), name="course-subscription-bulk"),
+    path("search/courses/", views.CourseSearchAPIView.as_view(), name="search-course"),
+    path("search/lessons/", views.LessonSearchAPIView.as_view(), name="search-lesson"),
     path("", include(router.urls)),
 ]
@@ -1,13 +1,47 @@
 import re
+from functools import lru_cache
+
 from rest_framework.serializers import ValidationError
 
-ALLOW_DOMAINS = [
-    "youtube.com",
-    "youtube.ru",
-    "googlevideo.com",
-    "ytimg.com",
-    "youtu.be",
-]
+ALLOW_DOMAINS = frozenset(
+    {
+        "youtube.com",
+        "youtube.ru",
+        "googlevideo.com",
+        "ytimg.com",
+        "youtu.be",
+    }
+)
+
+# Ссылка ищется по "://" (литерал в начале шаблона - быстрый поиск по тексту), схема проверяется по месту.
+# Хост: без userinfo (user@), до порта, пути, запроса или фрагмента
+LINK_HOST_RE = re.compile(r"://(?:[^\s/?#@]*@)?([^\s/?#:]+)")
+HOST_TRAILING_CHARS = ".,;!)]}'\"»"
+
+
+def get_link_domains(text):
+    """Домены всех http(s)-ссылок в тексте за один проход."""
+
+    domains = set()
+    for match in LINK_HOST_RE.finditer(text):
+        start = match.start()
+        if text[start - 4 : start].lower() == "http" or text[start - 5 : start].lower() == "https":
+            domain = match.group(1).rstrip(HOST_TRAILING_CHARS).lower()
+            if domain:
+                domains.add(domain)
+    return domains
+
+
+@lru_cache(maxsize=1024)
+def is_allowed_domain(domain):
+    """Домен из ALLOW_DOMAINS или его поддомен (www.youtube.com, m.youtube.com)."""
+
+    while True:
+        if domain in ALLOW_DOMAINS:
+            return True
+        _, dot, domain = domain.partition(".")
+        if not dot:
+            return False
 
 
 class YoutubeOnly:
@@ -20,12 +54,11 @@ class YoutubeOnly:
         self.fields = fields[:]
 
     def __call__(self, data):
-        for key, value in data.items():
-            if key not in self.fields:
+        for key in self.fields:
+            value = data.get(key)
+            if not isinstance(value, str):
                 continue
 
-            domains = re.split(r"[hH][tT][tT][pP][sS]?://", value)
-            for word in domains[1:]:
-                domain = word.split(" ")[0].split("/")[0]
-                if domain not in ALLOW_DOMAINS:
+            for domain in sorted(get_link_domains(value)):
+                if not is_allowed_domain(domain):
                     raise ValidationError(f"[{key}]: Allowed references from YouTube only! Not {domain}")
@@ -1,18 +1,33 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import viewsets, generics, views
+from rest_framework import viewsets, generics, status, views
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from edu.models import Course, Lesson, Subscription
-from edu.paginators import ResultsSetPagination
+from edu.paginators import PaginationModeMixin, ResultsSetPagination, SearchPagination
 from edu.permissions import IsModerator, IsOwner
-from edu.serializers import CourseSerializer, LessonSerializer, SubscriptionSerializer
-from edu.service import update_course
+from edu.serializers import (
+    CourseSearchSerializer,
+    CourseSerializer,
+    LessonBulkSerializer,
+    LessonSearchSerializer,
+    LessonSerializer,
+    SubscriptionBulkSerializer,
+    SubscriptionSerializer,
+)
+from edu.service import get_cached_course, invalidate_course_cache, search, set_cached_course, update_course
 from edu.tasks import send_email_about_course_update
+from users.roles import is_moderator
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(PaginationModeMixin, viewsets.ModelViewSet):
     """Курсы."""
 
     queryset = Course.objects.all()
@@ -38,22 +53,70 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer.validated_data["owner"] = self.request.user
         serializer.save()
 
+    @transaction.atomic
     def perform_update(self, serializer):
-        serializer.save()
-        instance = self.get_object()
-        update_course(instance.id)
+        instance = serializer.save()
+        update_course(instance.id, "Обновлена информация о курсе")
 
-    # def get_queryset(self):
-    #     """
-    #     Полный список курсов виден только модератору.
-    #     Остальным видно только свои курсы.
-    #     """
-
-    #     if self.action == "list":
-    #         if self.request.user.groups.filter(name="moderators").exists():
-    #             return Course.objects.all()
-    #         return self.queryset.filter(owner=self.request.user)
-    #     return Course.objects.all()
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        course_id = instance.id
+        instance.delete()
+        transaction.on_commit(lambda: invalidate_course_cache(course_id))
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Общая для всех пользователей часть курса берется из кеша,
+        флаг подписки текущего пользователя добавляется отдельно.
+        В кеше хранится полное представление, ?fields применяется к нему.
+        """
+
+        course_id = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        data = get_cached_course(course_id)
+        if data is None:
+            instance = self.get_object()
+            data = self.get_serializer(instance, fields=CourseSerializer.Meta.fields).data
+            set_cached_course(instance.pk, data)
+        else:
+            subscribed = Subscription.objects.filter(course_id=course_id, user=request.user).exists()
+            data = {**data, "is_subscribed": CourseSerializer.get_subscription_label(subscribed)}
+
+        fields = CourseSerializer.get_requested_fields(request)
+        if fields is not None:
+            data = {key: value for key, value in data.items() if key in fields}
+        return Response(data)
+
+    def get_queryset(self):
+        """
+        Количество уроков и флаг подписки считаются аннотациями,
+        уроки подгружаются одним запросом, чтобы список не делал запросов на каждый курс.
+        Для списка с ?fields запрашивается только то, что попадет в ответ.
+        """
+
+        fields = CourseSerializer.get_requested_fields(self.request) if self.action == "list" else None
+        queryset = Course.objects.all()
+
+        if fields is None or "count_lessons" in fields:
+            # Подзапрос вместо Count("lessons"): без GROUP BY считается только для курсов текущей страницы
+            lessons_count = (
+                Lesson.objects.filter(course=OuterRef("pk")).order_by().values("course").annotate(count=Count("pk"))
+            )
+            queryset = queryset.annotate(lessons_count=Coalesce(Subquery(lessons_count.values("count")), 0))
+
+        if fields is None or "is_subscribed" in fields:
+            user = self.request.user
+            if user.is_authenticated:
+                subscribed = Exists(Subscription.objects.filter(course=OuterRef("pk"), user=user))
+            else:
+                subscribed = Value(False)
+            queryset = queryset.annotate(user_subscribed=subscribed)
+
+        if fields is None or "lessons" in fields:
+            queryset = queryset.prefetch_related(Prefetch("lessons", queryset=Lesson.objects.all()))
+
+        if fields is not None:
+            queryset = queryset.only(*CourseSerializer.get_model_fields(fields))
+        return queryset
 
 
 class LessonCreateAPIView(generics.CreateAPIView):
@@ -65,12 +128,119 @@ class LessonCreateAPIView(generics.CreateAPIView):
     serializer_class = LessonSerializer
     permission_classes = (IsAuthenticated & ~IsModerator,)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.validated_data["owner"] = self.request.user
-        serializer.save()
+        lesson = serializer.save()
 
-        course = serializer.instance.course
-        update_course(course.id)
+        update_course(lesson.course_id, f"Добавлен урок «{lesson.name}»")
+
+
+class LessonBulkAPIView(generics.GenericAPIView):
+    """
+    Массовое создание/редактирование уроков (импорт программы курса).
+    Каждый элемент проверяется отдельно, корректные сохраняются одной транзакцией
+    (bulk_create/bulk_update), дата изменения курса обновляется один раз на курс.
+    Ошибки возвращаются по каждому элементу.
+    """
+
+    serializer_class = LessonBulkSerializer
+    permission_classes = (IsAuthenticated,)
+    max_items = 200
+
+    @swagger_auto_schema(
+        request_body=LessonBulkSerializer(many=True),
+        operation_description="Массовое создание/редактирование уроков.",
+        responses={201: "'results': [{'index', 'id', 'status'} или {'index', 'errors'}]"},
+    )
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "Ожидается непустой список уроков."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response(
+                {"detail": f"Не более {self.max_items} уроков за один запрос."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        items = [item if isinstance(item, dict) else {} for item in items]
+
+        user = request.user
+        moderator = is_moderator(request)
+        courses = Course.objects.in_bulk(self._get_ids(item.get("course") for item in items))
+        lessons = Lesson.objects.in_bulk(self._get_ids(item.get("id") for item in items))
+        context = {**self.get_serializer_context(), "courses": courses}
+
+        results, created, updated, update_fields = [], [], [], set()
+        changes = defaultdict(Counter)
+        for index, item in enumerate(items):
+            instance = None
+            if item.get("id") is not None:
+                instance = lessons.get(next(iter(self._get_ids([item["id"]])), None))
+                if instance is None:
+                    results.append({"index": index, "errors": {"id": ["Урок не найден."]}})
+                    continue
+                if not moderator and instance.owner_id != user.pk:
+                    results.append({"index": index, "errors": {"id": ["Нет прав на редактирование урока."]}})
+                    continue
+            elif moderator:
+                results.append({"index": index, "errors": {"detail": ["Модератор не может создавать уроки."]}})
+                continue
+
+            serializer = self.get_serializer(instance, data=item, partial=instance is not None, context=context)
+            if not serializer.is_valid():
+                results.append({"index": index, "errors": serializer.errors})
+                continue
+
+            data = {key: value for key, value in serializer.validated_data.items() if key != "id"}
+            result = {"index": index}
+            if instance is None:
+                lesson = Lesson(owner=user, **data)
+                created.append((lesson, result))
+                changes[lesson.course_id]["Добавлено уроков"] += 1
+            else:
+                old_course_id = instance.course_id
+                for attr, value in data.items():
+                    setattr(instance, attr, value)
+                update_fields.update(data)
+                updated.append((instance, result))
+                if old_course_id != instance.course_id:
+                    changes[old_course_id]["Перенесено уроков в другие курсы"] += 1
+                    changes[instance.course_id]["Добавлено уроков"] += 1
+                else:
+                    changes[instance.course_id]["Изменено уроков"] += 1
+            results.append(result)
+
+        with transaction.atomic():
+            Lesson.objects.bulk_create([lesson for lesson, _ in created])
+            if updated and update_fields:
+                Lesson.objects.bulk_update([lesson for lesson, _ in updated], sorted(update_fields))
+            for course_id, counter in changes.items():
+                update_course(course_id, ", ".join(f"{text}: {count}" for text, count in counter.items()))
+
+        for lesson, result in created:
+            result.update(id=lesson.pk, status="created")
+        for lesson, result in updated:
+            result.update(id=lesson.pk, status="updated")
+
+        errors = sum("errors" in result for result in results)
+        if errors == len(results):
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        elif created:
+            response_status = status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({"results": results}, status=response_status)
+
+    @staticmethod
+    def _get_ids(values):
+        ids = set()
+        for value in values:
+            if isinstance(value, int) and not isinstance(value, bool):
+                ids.add(value)
+            elif isinstance(value, str) and value.isdigit():
+                ids.add(int(value))
+        return ids
 
 
 class LessonDestroyAPIView(generics.DestroyAPIView):
@@ -82,12 +252,13 @@ class LessonDestroyAPIView(generics.DestroyAPIView):
     queryset = Lesson.objects.all()
     permission_classes = (IsAuthenticated & IsOwner,)
 
+    @transaction.atomic
     def perform_destroy(self, instance):
-        course = Course.objects.get(pk=instance.course.id)
-        update_course(course.id)
-
+        course_id = instance.course_id
         instance.delete()
 
+        update_course(course_id, f"Удален урок «{instance.name}»")
+
 
 class LessonRetrieveAPIView(generics.RetrieveAPIView):
     """
@@ -110,21 +281,22 @@ class LessonUpdateAPIView(generics.UpdateAPIView):
     serializer_class = LessonSerializer
     permission_classes = (IsModerator | (IsAuthenticated & IsOwner),)
 
+    @transaction.atomic
     def perform_update(self, serializer):
         """Если у урока меняется курс, отправить уведомления на оба курса: старый и новый"""
 
-        lesson = self.get_object()
-        course = Course.objects.get(pk=lesson.course.id)
-        update_course(course.id)
+        # serializer.instance уже загружен get_object(), повторно урок и курс не запрашиваются
+        old_course_id, old_name = serializer.instance.course_id, serializer.instance.name
+        lesson = serializer.save()
 
-        serializer.save()
-
-        new_course = serializer.instance.course
-        if course != new_course:
-            update_course(new_course.id)
+        if old_course_id != lesson.course_id:
+            update_course(old_course_id, f"Урок «{old_name}» перенесен в другой курс")
+            update_course(lesson.course_id, f"Добавлен урок «{lesson.name}»")
+        else:
+            update_course(lesson.course_id, f"Изменен урок «{lesson.name}»")
 
 
-class LessonListAPIView(generics.ListAPIView):
+class LessonListAPIView(PaginationModeMixin, generics.ListAPIView):
     """
     Просмотр списка уроков.
     """
@@ -134,10 +306,11 @@ class LessonListAPIView(generics.ListAPIView):
     permission_classes = (IsModerator | (IsAuthenticated & IsOwner),)
     pagination_class = ResultsSetPagination
 
-    # def get_queryset(self):
-    #     if self.request.user.groups.filter(name="moderators").exists():
-    #         return Lesson.objects.all()
-    #     return Lesson.objects.filter(owner=self.request.user)
+    def get_queryset(self):
+        fields = LessonSerializer.get_requested_fields(self.request)
+        if fields is None:
+            return self.queryset.all()
+        return self.queryset.only(*LessonSerializer.get_model_fields(fields))
 
 
 class SubscriptionAPIView(views.APIView):
@@ -157,14 +330,85 @@ class SubscriptionAPIView(views.APIView):
 
         user = self.request.user
         course_id = self.request.data.get("course")
-        course_item = get_object_or_404(Course, pk=course_id)
-
-        subs_item = Subscription.objects.filter(user=user, course=course_item)
 
-        if subs_item.exists():
-            subs_item.delete()
+        # Условное удаление одним запросом; если удалять нечего - вставка без дубликатов
+        # (уникальность пары пользователь-курс гарантирует БД)
+        deleted, _ = Subscription.objects.filter(user=user, course_id=course_id).delete()
+        if deleted:
             message = "подписка удалена"
         else:
-            Subscription.objects.create(user=user, course=course_item)
+            course_item = get_object_or_404(Course.objects.only("id"), pk=course_id)
+            Subscription.objects.bulk_create([Subscription(user=user, course=course_item)], ignore_conflicts=True)
             message = "подписка добавлена"
         return Response({"message": message})
+
+
+class SubscriptionBulkAPIView(views.APIView):
+    """
+    Подписка/отписка сразу на несколько курсов.
+    """
+
+    serializer_class = SubscriptionBulkSerializer
+    permission_classes = (IsAuthenticated,)
+
+    @swagger_auto_schema(
+        request_body=SubscriptionBulkSerializer,
+        operation_description="Подписка/отписка сразу на несколько курсов.",
+        responses={200: "'subscribed'/'unsubscribed': [id курсов], 'not_found': [id курсов]"},
+    )
+    def post(self, *args, **kwargs):
+        serializer = SubscriptionBulkSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user = self.request.user
+        course_ids = set(serializer.validated_data["courses"])
+
+        if serializer.validated_data["action"] == SubscriptionBulkSerializer.UNSUBSCRIBE:
+            Subscription.objects.filter(user=user, course_id__in=course_ids).delete()
+            return Response({"unsubscribed": sorted(course_ids)})
+
+        found_ids = set(Course.objects.filter(pk__in=course_ids).values_list("pk", flat=True))
+        Subscription.objects.bulk_create(
+            [Subscription(user=user, course_id=course_id) for course_id in found_ids], ignore_conflicts=True
+        )
+        return Response({"subscribed": sorted(found_ids), "not_found": sorted(course_ids - found_ids)})
+
+
+class SearchAPIView(generics.ListAPIView):
+    """
+    Полнотекстовый поиск: ?q=<запрос> (поддерживается синтаксис websearch: "фраза", -исключить, or).
+    Результаты по убыванию релевантности, пагинация по курсору.
+    """
+
+    pagination_class = SearchPagination
+    filter_backends = ()
+    search_query_param = "q"
+    # Поля модели, которые читаются для ответа (rank добавляет поиск)
+    only_fields = ()
+
+    @swagger_auto_schema(manual_parameters=[openapi.Parameter("q", openapi.IN_QUERY, type=openapi.TYPE_STRING)])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        query = self.request.query_params.get(self.search_query_param, "").strip()
+        queryset = self.queryset.only(*self.only_fields)
+        if not query:
+            return queryset.annotate(rank=Value(0.0)).none()
+        return search(queryset, query)
+
+
+class CourseSearchAPIView(SearchAPIView):
+    """Поиск курсов."""
+
+    queryset = Course.objects.all()
+    serializer_class = CourseSearchSerializer
+    only_fields = ("id", "name", "description")
+
+
+class LessonSearchAPIView(SearchAPIView):
+    """Поиск уроков."""
+
+    queryset = Lesson.objects.all()
+    serializer_class = LessonSearchSerializer
+    only_fields = ("id", "name", "description", "course")
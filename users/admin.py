@@ -1,5 +1,6 @@
 from django.contrib import admin
 
-from users.models import User
+from users.models import StripePrice, User
 
 admin.site.register(User)
+admin.site.register(StripePrice)
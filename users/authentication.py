@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from users.models import StatelessUser, User
+
+
+def get_active_cache_key(user_id):
+    return f"users:active:{user_id}"
+
+
+def is_user_active(user_id):
+    """
+    Проверка, что пользователь существует и активен.
+    Результат кешируется на STATELESS_AUTH_RECHECK секунд - это и есть максимальная задержка,
+    с которой отключение пользователя вступает в силу для уже выданных токенов.
+    """
+
+    key = get_active_cache_key(user_id)
+    active = cache.get(key)
+    if active is None:
+        active = User.objects.filter(pk=user_id, is_active=True).exists()
+        cache.set(key, active, settings.STATELESS_AUTH_RECHECK)
+    return active
+
+
+def invalidate_user_active(user_ids):
+    cache.delete_many([get_active_cache_key(user_id) for user_id in user_ids])
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без загрузки пользователя на каждый запрос.
+    request.user собирается из claims токена (id, email, is_active),
+    остальные поля загружаются из БД, только если к ним обращается представление.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if not validated_token.get("is_active", True) or not is_user_active(user_id):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return StatelessUser.from_token(validated_token)
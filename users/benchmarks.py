@@ -0,0 +1,91 @@
+import json
+
+from django.db import connection, transaction
+
+from edu.models import Course, Lesson
+from users.models import Payment
+from users.paginators import PaymentKeysetPagination
+from users.services import get_stale_payments
+
+BENCH_COURSES = 50
+
+
+def seed_payments(count):
+    """
+    Заполняет таблицу платежей count строками одним INSERT ... SELECT generate_series.
+    Платежи распределены по BENCH_COURSES курсам и урокам, около 2% - неоплаченные.
+    """
+
+    courses, lessons = [], []
+    for i in range(BENCH_COURSES):
+        course, _ = Course.objects.get_or_create(name=f"bench course {i}")
+        lesson, _ = Lesson.objects.get_or_create(name=f"bench lesson {i}", course=course)
+        courses.append(course.pk)
+        lessons.append(lesson.pk)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {connection.ops.quote_name(Payment._meta.db_table)}
+                (date, course_id, lesson_id, amount, method, session_id, link, created_at, status)
+            SELECT
+                CASE WHEN i %% 50 = 0 THEN NULL ELSE (now() - (i %% 1000) * interval '1 day')::date END,
+                CASE WHEN i %% 3 <> 0 THEN (%(courses)s::bigint[])[1 + i %% %(n)s] END,
+                CASE WHEN i %% 3 = 0 THEN (%(lessons)s::bigint[])[1 + i %% %(n)s] END,
+                100 + i %% 900,
+                CASE WHEN i %% 2 = 0 THEN 'CH' ELSE 'TF' END,
+                'cs_bench_' || i,
+                '',
+                now() - (i %% 1000) * interval '1 day',
+                'ready'
+            FROM generate_series(1, %(count)s) AS i
+            """,
+            {"courses": courses, "lessons": lessons, "n": BENCH_COURSES, "count": count},
+        )
+        cursor.execute(f"ANALYZE {connection.ops.quote_name(Payment._meta.db_table)}")
+    return courses[0], lessons[0]
+
+
+def get_payment_queries(course_id=None, lesson_id=None, session_id="cs_bench_1"):
+    """Запросы, которые выполняют список платежей (страница по курсору), check_payments и вебхук"""
+
+    page = PaymentKeysetPagination.page_size + 1
+    ordering = PaymentKeysetPagination.ordering
+    payments = Payment.objects.order_by(*ordering)
+    return {
+        "list": payments[:page],
+        "list_course": payments.filter(course_id=course_id)[:page],
+        "list_lesson": payments.filter(lesson_id=lesson_id)[:page],
+        "list_method": payments.filter(method="TF")[:page],
+        "pending_scan": get_stale_payments().only("id", "session_id"),
+        "webhook": Payment.objects.filter(session_id=session_id, date=None),
+    }
+
+
+def get_plan_nodes(plan):
+    """Узлы плана запроса (EXPLAIN FORMAT JSON) в порядке обхода"""
+
+    nodes = [plan]
+    for child in plan.get("Plans", ()):
+        nodes += get_plan_nodes(child)
+    return nodes
+
+
+def explain(queryset, analyze=False):
+    """
+    План запроса: список сканирований таблицы платежей и время выполнения (только с analyze).
+    Сканирование - кортеж (тип узла, индекс), например ("Index Scan", "payment_date_idx").
+    """
+
+    result = queryset.explain(format="json", analyze=analyze)
+    plan = json.loads(result)[0] if isinstance(result, str) else result[0]
+    scans = [
+        (node["Node Type"], node.get("Index Name"))
+        for node in get_plan_nodes(plan["Plan"])
+        if node.get("Relation Name") == Payment._meta.db_table or "Index Name" in node
+    ]
+    return scans, plan.get("Execution Time")
+
+
+def uses_index(scans):
+    return bool(scans) and all(node_type != "Seq Scan" for node_type, _ in scans)
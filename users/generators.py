@@ -0,0 +1,238 @@
+import io
+from datetime import timedelta
+from itertools import accumulate, islice
+from random import Random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from edu.models import Course, Lesson, Subscription
+from users.models import CASH, PAYMENT_PENDING, PAYMENT_READY, TRANSFER, Payment, User
+
+# Популярность курса по закону Ципфа: вес курса с рангом k - 1 / k ** FILL_ZIPF_EXPONENT
+FILL_ZIPF_EXPONENT = 1.1
+FILL_CITIES = ("Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург", None)
+FILL_TOPICS = ("Python", "Django", "SQL", "Алгоритмы", "Английский язык", "Дизайн", "Математика", "Маркетинг")
+FILL_WORDS = "основы практика проект задачи разбор примеры теория тесты запросы данные интерфейс модели".split()
+FILL_PRICES = (490, 990, 1990, 4990, 9990)
+
+
+class FillGenerator:
+    """
+    Синтетические данные: пользователи, курсы, уроки, подписки и платежи.
+    Строки полностью определяются seed и начальными id (даты - относительно now), поэтому
+    повторный запуск на той же базе с тем же seed дает те же данные.
+    Подписчики распределены по курсам по степенному закону: несколько популярных курсов
+    и длинный хвост почти пустых; платежи за курсы распределены так же.
+    """
+
+    def __init__(self, users=0, courses=0, lessons=0, subscriptions=0, payments=0, seed=0, password="password"):
+        self.users, self.courses, self.lessons = users, courses, lessons
+        self.subscriptions, self.payments = subscriptions, payments
+        self.seed = seed
+        self.password = password
+        self.now = timezone.now()
+        self.user_base = self.course_base = self.lesson_base = 1
+
+    def get_random(self, table):
+        # Отдельный генератор на таблицу: строки таблицы не зависят от размеров других
+        return Random(f"{self.seed}:{table}")
+
+    def reserve_ids(self):
+        """id новых строк идут подряд после текущего максимума, чтобы ссылаться на них без чтения из базы"""
+
+        for model, attr in ((User, "user_base"), (Course, "course_base"), (Lesson, "lesson_base")):
+            setattr(self, attr, (model.objects.aggregate(max_id=Max("id"))["max_id"] or 0) + 1)
+
+    def get_course_weights(self):
+        return list(accumulate(1 / rank**FILL_ZIPF_EXPONENT for rank in range(1, self.courses + 1)))
+
+    def get_user_rows(self):
+        rng = self.get_random("users")
+        password = make_password(self.password)
+        for user_id in range(self.user_base, self.user_base + self.users):
+            date_joined = self.now - timedelta(days=rng.uniform(0, 730))
+            # Около 10% не заходили ни разу, остальные - в течение полугода после регистрации
+            last_login = None if rng.random() < 0.1 else date_joined + timedelta(days=rng.uniform(0, 180))
+            yield (
+                user_id,
+                f"fill{user_id}@example.com",
+                password,
+                date_joined,
+                min(last_login, self.now) if last_login else None,
+                True,
+                False,
+                False,
+                "",
+                "",
+                rng.choice(FILL_CITIES),
+            )
+
+    def get_course_rows(self):
+        rng = self.get_random("courses")
+        for course_id in range(self.course_base, self.course_base + self.courses):
+            yield (
+                course_id,
+                f"{rng.choice(FILL_TOPICS)}: {' '.join(rng.sample(FILL_WORDS, 2))} ({course_id})",
+                " ".join(rng.choices(FILL_WORDS, k=rng.randint(5, 40))),
+                self.get_owner_id(rng),
+                self.now - timedelta(days=rng.uniform(0, 365)),
+            )
+
+    def get_lesson_rows(self):
+        rng = self.get_random("lessons")
+        for lesson_id in range(self.lesson_base, self.lesson_base + self.lessons):
+            yield (
+                lesson_id,
+                f"Урок {lesson_id}: {' '.join(rng.sample(FILL_WORDS, 2))}",
+                " ".join(rng.choices(FILL_WORDS, k=rng.randint(10, 80))),
+                f"https://www.youtube.com/watch?v=fill{lesson_id}",
+                self.course_base + rng.randrange(self.courses),
+                self.get_owner_id(rng),
+            )
+
+    def get_subscription_rows(self):
+        """
+        Курсу с рангом k достается доля подписок, пропорциональная его весу (не больше числа пользователей),
+        подписчики курса выбираются без повторов - уникальность (user, course) соблюдается без учета в памяти.
+        """
+
+        if not self.users or not self.courses:
+            return
+        rng = self.get_random("subscriptions")
+        weights = self.get_course_weights()
+        remainder = self.subscriptions
+        for rank, course_id in enumerate(range(self.course_base, self.course_base + self.courses)):
+            weight = weights[rank] - (weights[rank - 1] if rank else 0)
+            count = min(round(self.subscriptions * weight / weights[-1]), remainder, self.users)
+            remainder -= count
+            for user_index in rng.sample(range(self.users), count):
+                yield self.user_base + user_index, course_id
+
+    def get_payment_rows(self):
+        if not self.users or not self.courses:
+            return
+        rng = self.get_random("payments")
+        course_ids = range(self.course_base, self.course_base + self.courses)
+        weights = self.get_course_weights()
+        for i in range(self.payments):
+            created_at = self.now - timedelta(days=rng.uniform(0, 365))
+            course_id = lesson_id = None
+            if self.lessons and rng.random() < 1 / 3:
+                lesson_id = self.lesson_base + rng.randrange(self.lessons)
+            else:
+                course_id = rng.choices(course_ids, cum_weights=weights)[0]
+            # Около 2% еще не оплачены
+            pending = rng.random() < 0.02
+            yield (
+                self.user_base + rng.randrange(self.users),
+                None if pending else created_at.date(),
+                course_id,
+                lesson_id,
+                rng.choice(FILL_PRICES),
+                rng.choice((CASH, TRANSFER)),
+                f"cs_fill_{self.seed}_{i}",
+                None,
+                created_at,
+                PAYMENT_PENDING if pending and rng.random() < 0.1 else PAYMENT_READY,
+            )
+
+    def get_owner_id(self, rng):
+        return self.user_base + rng.randrange(self.users) if self.users else None
+
+    def get_tables(self):
+        """(модель, столбцы, строки) в порядке записи: сначала те, на кого ссылаются"""
+
+        user_fields = [
+            "id",
+            "email",
+            "password",
+            "date_joined",
+            "last_login",
+            "is_active",
+            "is_staff",
+            "is_superuser",
+            "first_name",
+            "last_name",
+            "city",
+        ]
+        return [
+            (User, user_fields, self.get_user_rows()),
+            (Course, ["id", "name", "description", "owner_id", "updated_at"], self.get_course_rows()),
+            (Lesson, ["id", "name", "description", "video_url", "course_id", "owner_id"], self.get_lesson_rows()),
+            (Subscription, ["user_id", "course_id"], self.get_subscription_rows()),
+            (
+                Payment,
+                [
+                    "user_id",
+                    "date",
+                    "course_id",
+                    "lesson_id",
+                    "amount",
+                    "method",
+                    "session_id",
+                    "link",
+                    "created_at",
+                    "status",
+                ],
+                self.get_payment_rows(),
+            ),
+        ]
+
+
+def get_copy_value(value):
+    """Значение в текстовом формате COPY"""
+
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_rows(model, fields, rows):
+    """Запись пачки строк через COPY FROM STDIN (PostgreSQL)"""
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(map(get_copy_value, row)))
+        buffer.write("\n")
+    buffer.seek(0)
+    columns = ", ".join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN", buffer)
+
+
+def bulk_create_rows(model, fields, rows):
+    model.objects.bulk_create([model(**dict(zip(fields, row))) for row in rows])
+
+
+def write_rows(model, fields, rows, batch_size, use_copy=None):
+    """
+    Пишет строки пачками по batch_size: через COPY в PostgreSQL или bulk_create в других базах.
+    Строки генерируются лениво, в памяти одновременно только одна пачка. Возвращает число строк.
+    """
+
+    if use_copy is None:
+        use_copy = connection.vendor == "postgresql"
+    write = copy_rows if use_copy else bulk_create_rows
+    count = 0
+    rows = iter(rows)
+    with transaction.atomic():
+        while batch := list(islice(rows, batch_size)):
+            write(model, fields, batch)
+            count += len(batch)
+    return count
+
+
+def reset_sequences(models):
+    """Счетчики id после явной записи id, чтобы следующие create не получили занятые значения"""
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
@@ -0,0 +1,133 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+from users.models import User
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+class MemoryLastLoginBuffer:
+    """
+    Буфер в памяти процесса (LAST_LOGIN_BUFFER_URL=memory://) - только для однопроцессного запуска и тестов.
+    Другие процессы и воркеры Celery его не видят, поэтому он сбрасывается и при записи входа,
+    если с прошлого сброса прошло больше LAST_LOGIN_FLUSH_INTERVAL.
+    """
+
+    flush_on_record = True
+
+    def __init__(self):
+        self.logins = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.drained_at = time.monotonic()
+
+    def add(self, user_id, logged_in_at):
+        with self.lock:
+            self.logins[user_id] = logged_in_at
+
+    @contextmanager
+    def flushing(self):
+        with self.flush_lock:
+            with self.lock:
+                # Входы, не записанные прошлым сбросом из-за ошибки, остаются в pending
+                if not self.pending:
+                    self.pending, self.logins = self.logins, {}
+                self.drained_at = time.monotonic()
+            yield dict(self.pending)
+            self.pending = {}
+
+    def is_stale(self):
+        return (
+            bool(self.logins)
+            and time.monotonic() - self.drained_at >= settings.LAST_LOGIN_FLUSH_INTERVAL.total_seconds()
+        )
+
+
+class RedisLastLoginBuffer:
+    """Буфер в хеше Redis {id пользователя: время входа}, общий для всех процессов и воркеров Celery"""
+
+    flush_on_record = False
+    key = "users:last_login"
+    flushing_key = "users:last_login:flushing"
+    lock_timeout = 60
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+
+    def add(self, user_id, logged_in_at):
+        self.client.hset(self.key, user_id, logged_in_at.timestamp())
+
+    @contextmanager
+    def flushing(self):
+        """
+        Хеш атомарно переименовывается в flushing_key: входы, записанные во время сброса, попадут в следующий.
+        flushing_key удаляется только после записи в БД - при ошибке (или падении процесса)
+        его забирает следующий сброс. Сбросы из разных процессов идут по очереди под блокировкой Redis.
+        """
+
+        with self.client.lock(f"{self.key}:lock", timeout=self.lock_timeout):
+            try:
+                self.client.renamenx(self.key, self.flushing_key)
+            except redis.ResponseError:
+                # Новых входов нет
+                pass
+            logins = self.client.hgetall(self.flushing_key)
+            yield {
+                int(user_id): datetime.fromtimestamp(float(timestamp), tz=dt_timezone.utc)
+                for user_id, timestamp in logins.items()
+            }
+            self.client.delete(self.flushing_key)
+
+    def is_stale(self):
+        return False
+
+
+def get_last_login_buffer():
+    """
+    Буфер входов по LAST_LOGIN_BUFFER_URL: redis://... или memory:// (один процесс).
+    Без общего хранилища буфер не используется (None): last_login пишется при входе.
+    """
+
+    url = settings.LAST_LOGIN_BUFFER_URL
+    if not url:
+        return None
+    if url not in _buffers:
+        with _buffers_lock:
+            if url not in _buffers:
+                _buffers[url] = MemoryLastLoginBuffer() if url.startswith("memory://") else RedisLastLoginBuffer(url)
+    return _buffers[url]
+
+
+def record_last_login(user):
+    """Запоминает вход пользователя в буфере вместо UPDATE users_user на каждый вход"""
+
+    buffer = get_last_login_buffer()
+    if buffer is None:
+        User.objects.filter(pk=user.pk).update(last_login=timezone.now())
+        return
+    buffer.add(user.pk, timezone.now())
+    if buffer.flush_on_record and buffer.is_stale():
+        flush_last_logins()
+
+
+def flush_last_logins():
+    """
+    Записывает накопленные входы в User.last_login пачками по LAST_LOGIN_FLUSH_BATCH. Возвращает их количество.
+    Если запись в БД не удалась, входы остаются в буфере до следующего сброса.
+    """
+
+    buffer = get_last_login_buffer()
+    if buffer is None:
+        return 0
+    with buffer.flushing() as logins:
+        users = [User(pk=user_id, last_login=logged_in_at) for user_id, logged_in_at in logins.items()]
+        User.objects.bulk_update(users, ["last_login"], batch_size=settings.LAST_LOGIN_FLUSH_BATCH)
+    return len(users)
@@ -0,0 +1,37 @@
+from django.core.management import BaseCommand, CommandError
+
+from users.benchmarks import explain, get_payment_queries, seed_payments, uses_index
+from users.models import Payment
+
+
+class Command(BaseCommand):
+    """
+    Планы запросов к платежам: список (по курсору, с фильтрами), сверка неоплаченных и поиск по session_id.
+    --seed N добавляет N платежей, --check завершается ошибкой, если какой-то запрос читает всю таблицу.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Сколько платежей добавить перед замером")
+        parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE (с выполнением запросов)")
+        parser.add_argument("--check", action="store_true", help="Ошибка, если запрос идет без индекса")
+
+    def handle(self, *args, **options) -> str | None:
+        if options["seed"]:
+            course_id, lesson_id = seed_payments(options["seed"])
+            print(f"Добавлено платежей: {options['seed']}")
+        else:
+            course_id = Payment.objects.filter(course__isnull=False).values_list("course_id", flat=True).first()
+            lesson_id = Payment.objects.filter(lesson__isnull=False).values_list("lesson_id", flat=True).first()
+        print(f"Всего платежей: {Payment.objects.count()}")
+
+        failed = []
+        for name, queryset in get_payment_queries(course_id, lesson_id).items():
+            scans, execution_time = explain(queryset, analyze=options["analyze"])
+            plan = ", ".join(f"{node_type} {index}" if index else node_type for node_type, index in scans)
+            timing = f" ({execution_time:.3f} мс)" if execution_time is not None else ""
+            print(f"{name}: {plan}{timing}")
+            if not uses_index(scans):
+                failed.append(name)
+
+        if failed and options["check"]:
+            raise CommandError(f"Запросы без индекса: {', '.join(failed)}")
@@ -1,20 +1,61 @@
-from datetime import date
-from random import choice, randint
+import time
+
 from django.contrib.auth.models import Group
 from django.core.management import BaseCommand
+from django.db import connection
 
 from edu.models import Course, Lesson
-from users.models import Payment, User
-
-chars = "qwertyuiopasdfghjklzxcvbnm"
-digits = "1234567890"
+from users.generators import FillGenerator, reset_sequences, write_rows
+from users.models import User
 
 
 class Command(BaseCommand):
     """
-    Создает группу модераторов
+    Создает группу модераторов и, если заданы размеры, синтетические данные для нагрузочных тестов
+    и проверки планов запросов: python3 manage.py fill --users 100000 --courses 1000 --lessons 20000
+    --subscriptions 1000000 --payments 2000000 --seed 1
     """
 
-    def handle(self, *args, **kwargs) -> str | None:
-        Group.objects.create(name="moderators")
-        print('Создана группа "moderators"')
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=0, help="Сколько пользователей добавить")
+        parser.add_argument("--courses", type=int, default=0, help="Сколько курсов добавить")
+        parser.add_argument("--lessons", type=int, default=0, help="Сколько уроков добавить")
+        parser.add_argument("--subscriptions", type=int, default=0, help="Сколько подписок добавить (примерно)")
+        parser.add_argument("--payments", type=int, default=0, help="Сколько платежей добавить")
+        parser.add_argument("--seed", type=int, default=0, help="Зерно генератора: тот же seed - те же данные")
+        parser.add_argument("--password", default="password", help="Пароль всех добавленных пользователей")
+        parser.add_argument("--batch-size", type=int, default=10000, help="Строк в одной пачке записи")
+        parser.add_argument("--bulk-create", action="store_true", help="Писать через bulk_create, а не COPY")
+
+    def handle(self, *args, **options) -> str | None:
+        _, created = Group.objects.get_or_create(name="moderators")
+        if created:
+            print('Создана группа "moderators"')
+
+        generator = FillGenerator(
+            users=options["users"],
+            courses=options["courses"],
+            lessons=options["lessons"] if options["courses"] else 0,
+            subscriptions=options["subscriptions"],
+            payments=options["payments"],
+            seed=options["seed"],
+            password=options["password"],
+        )
+        generator.reserve_ids()
+        use_copy = False if options["bulk_create"] else None
+
+        tables = []
+        for model, fields, rows in generator.get_tables():
+            started = time.perf_counter()
+            count = write_rows(model, fields, rows, options["batch_size"], use_copy=use_copy)
+            if not count:
+                continue
+            elapsed = time.perf_counter() - started
+            tables.append(model._meta.db_table)
+            print(f"{model._meta.db_table}: {count} за {elapsed:.1f} с ({count / elapsed:.0f} строк/с)")
+
+        reset_sequences([User, Course, Lesson])
+        if tables and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                for table in tables:
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 08:03
+
+import django.contrib.auth.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0013_alter_payment_options"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatelessUser",
+            fields=[],
+            options={
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("users.user",),
+            managers=[
+                ("objects", django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 08:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0014_statelessuser"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name="Дата создания"),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="session_id",
+            field=models.CharField(blank=True, db_index=True, max_length=400, null=True, verbose_name="id сессии"),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2 on 2026-10-18 08:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("edu", "0010_subscription_unique"),
+        ("users", "0015_payment_created_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StripePrice",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("amount", models.PositiveIntegerField(verbose_name="Сумма")),
+                ("product_id", models.CharField(max_length=255, verbose_name="id продукта")),
+                ("price_id", models.CharField(max_length=255, verbose_name="id цены")),
+                (
+                    "course",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stripe_prices",
+                        to="edu.course",
+                        verbose_name="Курс",
+                    ),
+                ),
+                (
+                    "lesson",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stripe_prices",
+                        to="edu.lesson",
+                        verbose_name="Урок",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Цена Stripe",
+                "verbose_name_plural": "Цены Stripe",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="stripeprice",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("lesson", None)), fields=("course", "amount"), name="unique_stripe_price_course"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="stripeprice",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("course", None)), fields=("lesson", "amount"), name="unique_stripe_price_lesson"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="stripeprice",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    models.Q(("course", None), ("lesson__isnull", False)),
+                    models.Q(("course__isnull", False), ("lesson", None)),
+                    _connector="OR",
+                ),
+                name="stripe_price_course_or_lesson",
+            ),
+        ),
+    ]
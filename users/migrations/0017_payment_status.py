@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0016_stripeprice"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Создается сессия оплаты"),
+                    ("ready", "Ссылка на оплату готова"),
+                    ("failed", "Не удалось создать сессию оплаты"),
+                ],
+                default="ready",
+                max_length=10,
+                verbose_name="Статус сессии оплаты",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+from config.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся без блокировки записи в таблицу платежей
+    atomic = False
+
+    dependencies = [
+        ("users", "0017_payment_status"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="payment",
+            index=models.Index(fields=["-date", "-id"], name="payment_date_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("course__isnull", False)),
+                fields=["course", "-date", "-id"],
+                name="payment_course_date_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("lesson__isnull", False)),
+                fields=["lesson", "-date", "-id"],
+                name="payment_lesson_date_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="payment",
+            index=models.Index(fields=["method", "-date", "-id"], name="payment_method_date_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("date__isnull", True), ("session_id__isnull", False)),
+                fields=["created_at"],
+                name="payment_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+from config.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("users", "0018_payment_indexes"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="user",
+            index=models.Index(fields=["is_active", "last_login"], name="user_active_last_login_idx"),
+        ),
+    ]
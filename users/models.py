@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 from edu.models import Course, Lesson
 
@@ -11,6 +12,14 @@ PAYMENT_METHODS = [
     (CASH, "Наличные"),
     (TRANSFER, "Перевод на счет"),
 ]
+PAYMENT_PENDING = "pending"
+PAYMENT_READY = "ready"
+PAYMENT_FAILED = "failed"
+PAYMENT_STATUSES = [
+    (PAYMENT_PENDING, "Создается сессия оплаты"),
+    (PAYMENT_READY, "Ссылка на оплату готова"),
+    (PAYMENT_FAILED, "Не удалось создать сессию оплаты"),
+]
 
 
 class User(AbstractUser):
@@ -27,11 +36,43 @@ class User(AbstractUser):
         verbose_name = "Пользователь"
         verbose_name = "Пользователи"
         ordering = ["-id"]
+        indexes = [
+            # Поиск давно не заходивших активных пользователей (disable_inactive_users)
+            models.Index(fields=["is_active", "last_login"], name="user_active_last_login_idx"),
+        ]
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
 
+class StatelessUser(User):
+    """
+    Пользователь, восстановленный из claims access-токена без запроса к БД.
+    Остальные поля отложены и загружаются одним запросом при первом обращении к любому из них.
+    """
+
+    TOKEN_CLAIMS = {"id": "user_id", "email": "email", "is_active": "is_active"}
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_token(cls, token):
+        field_names, values = [], []
+        for field in cls._meta.concrete_fields:
+            claim = cls.TOKEN_CLAIMS.get(field.attname)
+            if claim in token:
+                field_names.append(field.attname)
+                values.append(token[claim])
+        return cls.from_db("default", field_names, values)
+
+    def refresh_from_db(self, using=None, fields=None):
+        deferred_fields = self.get_deferred_fields()
+        if fields is not None and deferred_fields.issuperset(fields):
+            fields = deferred_fields
+        super().refresh_from_db(using, fields)
+
+
 class Payment(models.Model):
     user = models.ForeignKey(
         to=User, verbose_name="Пользователь", on_delete=models.DO_NOTHING, related_name="payments", **NULLABLE
@@ -45,8 +86,12 @@ class Payment(models.Model):
     )
     amount = models.PositiveIntegerField(verbose_name="Сумма оплаты")
     method = models.CharField(max_length=2, verbose_name="Способ оплаты", choices=PAYMENT_METHODS)
-    session_id = models.CharField(max_length=400, verbose_name="id сессии", **NULLABLE)
+    session_id = models.CharField(max_length=400, verbose_name="id сессии", db_index=True, **NULLABLE)
     link = models.URLField(max_length=400, verbose_name="Ссылка на оплату", **NULLABLE)
+    created_at = models.DateTimeField(verbose_name="Дата создания", default=timezone.now)
+    status = models.CharField(
+        max_length=10, verbose_name="Статус сессии оплаты", choices=PAYMENT_STATUSES, default=PAYMENT_READY
+    )
 
     def __str__(self):
         return f"{self.amount} - {self.user}"
@@ -55,3 +100,57 @@ class Payment(models.Model):
         verbose_name = "Платеж"
         verbose_name = "Платежи"
         ordering = ["-id"]
+        indexes = [
+            # Список платежей: сортировка по дате (пагинация по курсору) и фильтры по курсу, уроку, способу оплаты
+            models.Index(fields=["-date", "-id"], name="payment_date_idx"),
+            models.Index(
+                fields=["course", "-date", "-id"],
+                condition=models.Q(course__isnull=False),
+                name="payment_course_date_idx",
+            ),
+            models.Index(
+                fields=["lesson", "-date", "-id"],
+                condition=models.Q(lesson__isnull=False),
+                name="payment_lesson_date_idx",
+            ),
+            models.Index(fields=["method", "-date", "-id"], name="payment_method_date_idx"),
+            # Неоплаченные платежи с сессией Stripe (check_payments) - небольшая доля таблицы
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(date__isnull=True, session_id__isnull=False),
+                name="payment_pending_idx",
+            ),
+        ]
+
+
+class StripePrice(models.Model):
+    """Цена в Stripe для курса или урока с заданной суммой, создается один раз и переиспользуется"""
+
+    course = models.ForeignKey(
+        to=Course, verbose_name="Курс", on_delete=models.CASCADE, related_name="stripe_prices", **NULLABLE
+    )
+    lesson = models.ForeignKey(
+        to=Lesson, verbose_name="Урок", on_delete=models.CASCADE, related_name="stripe_prices", **NULLABLE
+    )
+    amount = models.PositiveIntegerField(verbose_name="Сумма")
+    product_id = models.CharField(max_length=255, verbose_name="id продукта")
+    price_id = models.CharField(max_length=255, verbose_name="id цены")
+
+    def __str__(self):
+        return f"{self.course or self.lesson} - {self.amount}"
+
+    class Meta:
+        verbose_name = "Цена Stripe"
+        verbose_name_plural = "Цены Stripe"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["course", "amount"], condition=models.Q(lesson=None), name="unique_stripe_price_course"
+            ),
+            models.UniqueConstraint(
+                fields=["lesson", "amount"], condition=models.Q(course=None), name="unique_stripe_price_lesson"
+            ),
+            models.CheckConstraint(
+                check=models.Q(course=None, lesson__isnull=False) | models.Q(course__isnull=False, lesson=None),
+                name="stripe_price_course_or_lesson",
+            ),
+        ]
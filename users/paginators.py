@@ -0,0 +1,7 @@
+from edu.paginators import KeysetPagination
+
+
+class PaymentKeysetPagination(KeysetPagination):
+    """Пагинация платежей по ключу: по дате оплаты, затем по id."""
+
+    ordering = ("-date", "-id")
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.cache import cache
+
+MODERATORS = "moderators"
+
+
+def get_roles_cache_key(user_id):
+    return f"users:roles:{user_id}"
+
+
+def get_user_roles(request):
+    """
+    Роли (названия групп) текущего пользователя.
+    Запоминаются на время запроса и кешируются между запросами,
+    при ROLES_FROM_TOKEN берутся из claim "roles" access-токена без обращения к БД.
+    """
+
+    roles = getattr(request, "_user_roles", None)
+    if roles is not None:
+        return roles
+
+    user = request.user
+    token = getattr(request, "auth", None)
+    if not user or not user.is_authenticated:
+        roles = frozenset()
+    elif settings.ROLES_FROM_TOKEN and token is not None and "roles" in token:
+        roles = frozenset(token["roles"])
+    else:
+        key = get_roles_cache_key(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(user.groups.values_list("name", flat=True))
+            cache.set(key, roles, settings.ROLES_CACHE_TIMEOUT)
+
+    request._user_roles = roles
+    return roles
+
+
+def is_moderator(request):
+    return MODERATORS in get_user_roles(request)
+
+
+def invalidate_user_roles(user_ids):
+    cache.delete_many([get_roles_cache_key(user_id) for user_id in user_ids])
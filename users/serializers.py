@@ -1,6 +1,17 @@
+from django.conf import settings
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+from drf_yasg.utils import swagger_serializer_method
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from edu.serializers import SparseFieldsetsMixin
+from users.last_login import record_last_login
 from users.models import Payment, User
+from users.services import get_payment_summaries
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -8,14 +19,70 @@ class PaymentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Payment
-        fields = "__all__"
-        read_only_fields = ["date", "session_id", "link", "user"]
+        exclude = ["created_at"]
+        read_only_fields = ["date", "session_id", "link", "user", "status"]
 
 
-class UserOwnerSerializer(serializers.ModelSerializer):
-    """Сериализатор профиля для владельца"""
+class PaymentStatusSerializer(serializers.ModelSerializer):
+    """Сериализатор статуса платежа"""
+
+    class Meta:
+        model = Payment
+        fields = ("id", "status", "link", "session_id", "date")
+
+
+class PaymentSummarySerializer(serializers.Serializer):
+    """Итоги по оплаченным платежам"""
+
+    count = serializers.IntegerField()
+    amount = serializers.IntegerField()
+    methods = serializers.DictField(child=serializers.DictField(child=serializers.IntegerField()))
+
+
+class UserPaymentsListSerializer(serializers.ListSerializer):
+    """Список профилей: итоги по платежам считаются одним запросом на всю страницу"""
+
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, "all") else data)
+        if "payments_summary" in self.child.fields:
+            summaries = get_payment_summaries([user.pk for user in users])
+            for user in users:
+                user.payment_summary = summaries[user.pk]
+        return super().to_representation(users)
+
+
+class UserPaymentsMixin(serializers.Serializer):
+    """
+    Платежи в профиле: последние PROFILE_PAYMENTS_LIMIT платежей (user.recent_payments из
+    get_recent_payments_prefetch), итоги по оплаченным платежам и ссылка на полный список платежей.
+    """
+
+    payments = serializers.SerializerMethodField()
+    payments_summary = serializers.SerializerMethodField()
+    payments_url = serializers.SerializerMethodField()
+
+    @swagger_serializer_method(serializer_or_field=PaymentSerializer(many=True))
+    def get_payments(self, obj):
+        payments = getattr(obj, "recent_payments", None)
+        if payments is None:
+            payments = obj.payments.all()[: settings.PROFILE_PAYMENTS_LIMIT]
+        return PaymentSerializer(payments, many=True, context=self.context).data
+
+    @swagger_serializer_method(serializer_or_field=PaymentSummarySerializer)
+    def get_payments_summary(self, obj):
+        summary = getattr(obj, "payment_summary", None)
+        if summary is None:
+            summary = get_payment_summaries([obj.pk])[obj.pk]
+        return summary
+
+    def get_payments_url(self, obj):
+        url = f"{reverse('users:payments-list')}?user={obj.pk}"
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
 
-    payments = PaymentSerializer(many=True)
+class UserOwnerSerializer(SparseFieldsetsMixin, UserPaymentsMixin, serializers.ModelSerializer):
+    """Сериализатор профиля для владельца"""
 
     class Meta:
         model = User
@@ -27,10 +94,13 @@ class UserOwnerSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "payments",
+            "payments_summary",
+            "payments_url",
         )
+        list_serializer_class = UserPaymentsListSerializer
 
 
-class UserGeneralSerializer(serializers.ModelSerializer):
+class UserGeneralSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """Сериализатор профиля для всех зарегистрированных"""
 
     class Meta:
@@ -42,11 +112,9 @@ class UserGeneralSerializer(serializers.ModelSerializer):
         )
 
 
-class UserModeratorSerializer(serializers.ModelSerializer):
+class UserModeratorSerializer(SparseFieldsetsMixin, UserPaymentsMixin, serializers.ModelSerializer):
     """Сериализатор профиля для модератора"""
 
-    payments = PaymentSerializer(many=True)
-
     class Meta:
         model = User
         fields = (
@@ -56,7 +124,10 @@ class UserModeratorSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "payments",
+            "payments_summary",
+            "payments_url",
         )
+        list_serializer_class = UserPaymentsListSerializer
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -68,3 +139,56 @@ class RegisterSerializer(serializers.ModelSerializer):
             "email",
             "password",
         )
+
+
+def set_user_claims(token, user):
+    """Данные пользователя и его роли в claims access-токена"""
+
+    token["email"] = user.email
+    token["is_active"] = user.is_active
+    token["roles"] = sorted(user.groups.values_list("name", flat=True))
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    Refresh-токен без данных пользователя: claims есть только в access-токенах и заполняются
+    при каждой выдаче, поэтому изменение ролей доходит до токенов не позже ACCESS_TOKEN_LIFETIME.
+    При обновлении пользователь читается из БД; удаленному или отключенному новый токен не выдается.
+    """
+
+    user = None
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = self.user
+        if user is None:
+            user_id = self[api_settings.USER_ID_CLAIM]
+            user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}, is_active=True).first()
+            if user is None:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        set_user_claims(access, user)
+        return access
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Сериализатор для получения токенов: данные пользователя и его роли добавляются в claims access-токена"""
+
+    token_class = UserRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token.user = user
+        return token
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        record_last_login(self.user)
+        return data
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """Обновление access-токена с актуальными данными и ролями пользователя"""
+
+    token_class = UserRefreshToken
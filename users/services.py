@@ -1,23 +1,186 @@
+import threading
+import time
+
 import requests
 import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Prefetch, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
 from rest_framework import status
-from config import settings
 
+from users.models import PAYMENT_METHODS, Payment, StripePrice
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Общая на процесс сессия с пулом соединений к Stripe: соединения (и TLS) переиспользуются
+    между запросами и потоками вместо нового подключения на каждый платеж.
+    """
+
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_CONCURRENCY)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return _http_session
+
+
+class RateLimiter:
+    """Ограничение числа запросов в секунду, общее для всех потоков"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
 
-def get_session(session_id):
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(self.next_time, now) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def get_session(session_id, rate_limiter=None):
     """Получает сессию из Stripe"""
-    url = "https://api.stripe.com/v1/checkout/sessions/"
+    url = f"{settings.STRIPE_API_BASE}/v1/checkout/sessions/"
     api_key = settings.STRIPE_API_KEY
 
-    response = requests.get(f"{url}{session_id}", auth=(api_key, ""), timeout=10)
+    if rate_limiter is not None:
+        rate_limiter.wait()
+
+    try:
+        response = get_http_session().get(f"{url}{session_id}", auth=(api_key, ""), timeout=settings.STRIPE_TIMEOUT)
+    except requests.RequestException:
+        return
 
     if response.status_code == status.HTTP_200_OK:
         return response.json()
     return
 
 
+def get_recent_payments_prefetch():
+    """
+    Prefetch последних PROFILE_PAYMENTS_LIMIT платежей каждого пользователя в user.recent_payments.
+    Одним запросом на страницу пользователей: лишние строки отсекаются оконной функцией в базе.
+    """
+
+    payments = (
+        Payment.objects.annotate(row_number=Window(RowNumber(), partition_by=F("user_id"), order_by=F("id").desc()))
+        .filter(row_number__lte=settings.PROFILE_PAYMENTS_LIMIT)
+        .order_by("-id")
+    )
+    return Prefetch("payments", queryset=payments, to_attr="recent_payments")
+
+
+def get_payment_summaries(user_ids):
+    """
+    Итоги по оплаченным платежам пользователей одним запросом (GROUP BY пользователь, способ оплаты):
+    {user_id: {"count": ..., "amount": ..., "methods": {method: {"count": ..., "amount": ...}}}}
+    """
+
+    summaries = {
+        user_id: {
+            "count": 0,
+            "amount": 0,
+            "methods": {method: {"count": 0, "amount": 0} for method, _ in PAYMENT_METHODS},
+        }
+        for user_id in user_ids
+    }
+    rows = (
+        Payment.objects.filter(user_id__in=summaries, date__isnull=False)
+        .order_by()
+        .values("user_id", "method")
+        .annotate(count=Count("id"), amount=Sum("amount"))
+    )
+    for row in rows:
+        summary = summaries[row["user_id"]]
+        summary["count"] += row["count"]
+        summary["amount"] += row["amount"]
+        summary["methods"][row["method"]] = {"count": row["count"], "amount": row["amount"]}
+    return summaries
+
+
+def get_stale_payments():
+    """
+    Неоплаченные платежи с сессией Stripe, созданные от STRIPE_CHECK_STALE_AFTER до STRIPE_CHECK_MAX_AGE назад
+    (идут по частичному индексу payment_pending_idx)
+    """
+
+    now = timezone.now()
+    return Payment.objects.filter(
+        date=None,
+        session_id__isnull=False,
+        created_at__lt=now - settings.STRIPE_CHECK_STALE_AFTER,
+        created_at__gte=now - settings.STRIPE_CHECK_MAX_AGE,
+    ).exclude(session_id="")
+
+
+def construct_webhook_event(payload, signature):
+    """Проверяет подпись вебхука Stripe и возвращает событие (ValueError, SignatureVerificationError - если неверно)"""
+    return stripe.Webhook.construct_event(payload, signature, settings.STRIPE_WEBHOOK_SECRET)
+
+
+def confirm_payment(session_id):
+    """
+    Отмечает платеж по сессии оплаченным.
+    Обновляет только неоплаченный платеж, поэтому повторная доставка события ничего не меняет.
+    Возвращает количество подтвержденных платежей.
+    """
+
+    return Payment.objects.filter(session_id=session_id, date=None).update(date=timezone.localdate(), link="")
+
+
+def get_stripe_price_cache_key(course_id, lesson_id, amount):
+    return f"users:stripe_price:{course_id}:{lesson_id}:{amount}"
+
+
+def get_price_id(payment):
+    """
+    Возвращает id цены Stripe для оплачиваемого курса (или урока) и суммы платежа.
+    Цена ищется в кеше, затем в StripePrice; продукт в Stripe создается только для новой пары
+    (курс/урок, сумма). Сумма входит в ключ, поэтому при ее изменении старая цена не используется.
+    """
+
+    if payment.course_id:
+        lookup = {"course_id": payment.course_id, "lesson_id": None}
+    else:
+        lookup = {"course_id": None, "lesson_id": payment.lesson_id}
+    key = get_stripe_price_cache_key(amount=payment.amount, **lookup)
+    price_id = cache.get(key)
+    if price_id is None:
+        price_id = (
+            StripePrice.objects.filter(amount=payment.amount, **lookup).values_list("price_id", flat=True).first()
+        )
+    if price_id is None:
+        name = payment.course.name if payment.course_id else payment.lesson.name
+        product = create_product(name, payment.amount)
+        price, _ = StripePrice.objects.get_or_create(
+            amount=payment.amount,
+            defaults={"product_id": product.get("id"), "price_id": product.get("default_price")},
+            **lookup,
+        )
+        price_id = price.price_id
+    cache.set(key, price_id, settings.STRIPE_PRICE_CACHE_TIMEOUT)
+    return price_id
+
+
 def create_product(name, amount):
     stripe.api_key = settings.STRIPE_API_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
 
     return stripe.Product.create(
         name=name,
@@ -28,12 +191,13 @@ def create_product(name, amount):
     )
 
 
-def create_session(product):
+def create_session(price_id):
     stripe.api_key = settings.STRIPE_API_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
 
     session = stripe.checkout.Session.create(
         success_url="http://127.0.0.1:8000/",
-        line_items=[{"price": product.get("default_price"), "quantity": 1}],
+        line_items=[{"price": price_id, "quantity": 1}],
         mode="payment",
     )
 
@@ -0,0 +1,46 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.authentication import invalidate_user_active
+from users.models import User
+from users.roles import invalidate_user_roles
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает кеш ролей при изменении состава групп (user.groups и group.user_set)."""
+
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            invalidate_user_roles([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        invalidate_user_roles(pk_set)
+    elif action == "pre_clear":
+        instance._cleared_user_ids = list(instance.user_set.values_list("pk", flat=True))
+    elif action == "post_clear":
+        invalidate_user_roles(getattr(instance, "_cleared_user_ids", []))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    """Сбрасывает кеш ролей участников при переименовании или удалении группы."""
+
+    if not kwargs.get("created"):
+        invalidate_user_roles(instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    """Сбрасывает кеш ролей удаленного пользователя: его id может достаться новому пользователю."""
+
+    invalidate_user_roles([instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Отключение или удаление пользователя сразу действует на выданные токены."""
+
+    invalidate_user_active([instance.pk])
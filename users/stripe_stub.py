@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """
+    Ответы в формате Stripe API: сессии cs_paid_* оплачены, cs_open_* - нет, остальные не найдены.
+    POST создает продукт с ценой или сессию оплаты.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests += 1
+        self.server.connections.add(self.client_address)
+        time.sleep(self.server.delay)
+
+        session_id = self.path.rsplit("/", 1)[-1]
+        if session_id.startswith("cs_paid_"):
+            code, data = 200, {"id": session_id, "object": "checkout.session", "status": "complete"}
+        elif session_id.startswith("cs_open_"):
+            code, data = 200, {"id": session_id, "object": "checkout.session", "status": "open"}
+        else:
+            code, data = 404, {"error": {"type": "invalid_request_error"}}
+        self.send_json(code, data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests += 1
+        self.server.posts.append(self.path)
+        number = len(self.server.posts)
+
+        if self.path == "/v1/products":
+            data = {"id": f"prod_{number}", "object": "product", "default_price": f"price_{number}"}
+        elif self.path == "/v1/checkout/sessions":
+            session_id = f"cs_open_{number}"
+            data = {"id": session_id, "object": "checkout.session", "url": f"https://checkout.stripe.com/{session_id}"}
+        else:
+            return self.send_json(404, {"error": {"type": "invalid_request_error"}})
+        self.send_json(200, data)
+
+    def send_json(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    """Заглушка Stripe API на свободном порту (url - для STRIPE_API_BASE), работает в фоновом потоке"""
+
+    daemon_threads = True
+
+    def __init__(self, delay=0):
+        super().__init__(("127.0.0.1", 0), FakeStripeHandler)
+        self.delay = delay
+        self.requests = 0
+        self.connections = set()
+        self.posts = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -1,40 +1,107 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import stripe
+from django.conf import settings
 from django.utils import timezone
 from celery import shared_task
+from celery.utils.log import get_task_logger
+
+from users.authentication import invalidate_user_active
+from users.last_login import flush_last_logins as flush_last_login_buffer
+from users.models import PAYMENT_FAILED, PAYMENT_PENDING, PAYMENT_READY, Payment, User
+from users.services import RateLimiter, create_session, get_price_id, get_session, get_stale_payments
 
-from users.models import Payment, User
-from users.services import get_session
+logger = get_task_logger(__name__)
+
+
+@shared_task
+def flush_last_logins():
+    """Записывает буферизованные входы пользователей в last_login"""
+
+    return flush_last_login_buffer()
 
 
 @shared_task
 def disable_inactive_users():
     """
-    Отключает пользователей (is_active),
-    которые не логинились более 30 дней"""
+    Отключает пользователей (is_active), которые не логинились дольше USER_INACTIVE_AFTER.
+    Работает пачками по USER_DISABLE_CHUNK_SIZE: id пачки выбираются по индексу (is_active, last_login),
+    затем отключаются одним UPDATE, в памяти не больше одной пачки id.
+    Перед выборкой сбрасывается буфер входов, чтобы недавно вошедшие не считались неактивными.
+    Возвращает количество отключенных пользователей, пачек и время работы.
+    """
 
-    deltatime = timezone.now() - timezone.timedelta(days=30)
+    started = time.monotonic()
+    flush_last_login_buffer()
+    deadline = timezone.now() - settings.USER_INACTIVE_AFTER
+    inactive = User.objects.filter(is_staff=False, is_superuser=False, is_active=True, last_login__lt=deadline)
+    inactive_ids = inactive.order_by("last_login").values_list("pk", flat=True)
 
-    users = User.objects.filter(is_staff=False, is_superuser=False, is_active=True, last_login__lt=deltatime)
+    disabled = chunks = 0
+    while user_ids := list(inactive_ids[: settings.USER_DISABLE_CHUNK_SIZE]):
+        # Повторная проверка условий в UPDATE: пользователь мог войти после выбора пачки
+        disabled += inactive.filter(pk__in=user_ids).update(is_active=False)
+        invalidate_user_active(user_ids)
+        chunks += 1
 
-    if users:
-        for user in users:
-            user.is_active = False
-        User.objects.bulk_update(users, ["is_active"])
+    metrics = {"disabled": disabled, "chunks": chunks, "seconds": round(time.monotonic() - started, 3)}
+    logger.info("Отключено неактивных пользователей: %(disabled)s (пачек: %(chunks)s, %(seconds)s с)", metrics)
+    return metrics
 
 
 @shared_task
 def check_payments():
-    payments = Payment.objects.filter(date=None)
-    print(payments.count())
+    """
+    Страховочная сверка платежей со Stripe: основной путь подтверждения - вебхук,
+    здесь проверяются только неоплаченные платежи, созданные от STRIPE_CHECK_STALE_AFTER
+    до STRIPE_CHECK_MAX_AGE назад (по которым вебхук так и не пришел).
+    Сессии запрашиваются параллельно (STRIPE_CONCURRENCY потоков, не чаще STRIPE_RATE_LIMIT в секунду)
+    через общий пул соединений, оплаченные платежи сохраняются одним bulk_update на пачку.
+    Возвращает количество подтвержденных платежей.
+    """
+
+    payments = get_stale_payments().only("id", "session_id").iterator(chunk_size=settings.STRIPE_CHECK_CHUNK_SIZE)
+    rate_limiter = RateLimiter(settings.STRIPE_RATE_LIMIT)
+    completed = 0
+
+    with ThreadPoolExecutor(max_workers=settings.STRIPE_CONCURRENCY) as executor:
+        while chunk := list(islice(payments, settings.STRIPE_CHECK_CHUNK_SIZE)):
+            sessions = executor.map(lambda payment: get_session(payment.session_id, rate_limiter), chunk)
+
+            paid = []
+            for payment, session in zip(chunk, sessions):
+                if session and session.get("status") == "complete":
+                    payment.link = ""
+                    payment.date = timezone.localdate()
+                    paid.append(payment)
+
+            Payment.objects.bulk_update(paid, ["link", "date"])
+            completed += len(paid)
+
+    return completed
+
+
+@shared_task(bind=True, max_retries=3)
+def create_checkout_session(self, payment_id):
+    """
+    Создает сессию оплаты Stripe для платежа в статусе pending и сохраняет ссылку.
+    При ошибке Stripe повторяет попытку с растущей паузой, после последней - статус failed.
+    """
 
-    for payment in payments:
-        if not payment.session_id:
-            continue
+    payment = Payment.objects.select_related("course", "lesson").filter(pk=payment_id, status=PAYMENT_PENDING).first()
+    if payment is None:
+        return
 
-        session = get_session(payment.session_id)
-        if not session:
-            continue
+    try:
+        url, session_id = create_session(get_price_id(payment))
+    except stripe.StripeError as exc:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=2**self.request.retries)
+        Payment.objects.filter(pk=payment_id, status=PAYMENT_PENDING).update(status=PAYMENT_FAILED)
+        return
 
-        if session.get("status") == "complete":
-            payment.link = ""
-            payment.date = timezone.now()
-            payment.save()
+    Payment.objects.filter(pk=payment_id, status=PAYMENT_PENDING).update(
+        session_id=session_id, link=url, status=PAYMENT_READY
+    )
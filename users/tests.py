@@ -1,16 +1,37 @@
-from datetime import date
+import hashlib
+import hmac
+import json
+import time
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 from edu.models import Course, Lesson, Subscription
-from users.models import Payment, User
+from users.benchmarks import explain, get_payment_queries, seed_payments, uses_index
+from users.generators import FillGenerator
+from users.models import Payment, StatelessUser, StripePrice, User
+from users.roles import get_roles_cache_key
+from users.stripe_stub import FakeStripeServer
+from users.authentication import is_user_active
+from users.last_login import get_last_login_buffer
+from users.tasks import check_payments, create_checkout_session, disable_inactive_users, flush_last_logins
 
 
 class UserTestCase(APITestCase):
 
     def setUp(self):
+        cache.clear()
         self.user1 = User.objects.create(email="user1@test.ru")
         self.user2 = User.objects.create(email="user2@test.ru")
         self.moderator = User.objects.create(email="moderator@test.ru")
@@ -58,6 +79,12 @@ class UserTestCase(APITestCase):
             "first_name": "",
             "last_name": "",
             "payments": [],
+            "payments_summary": {
+                "count": 0,
+                "amount": 0,
+                "methods": {"CH": {"count": 0, "amount": 0}, "TF": {"count": 0, "amount": 0}},
+            },
+            "payments_url": f"http://testserver{reverse('users:payments-list')}?user={self.user1.pk}",
             "phone": None,
         }
         # Неавторизован
@@ -109,6 +136,201 @@ class UserTestCase(APITestCase):
         self.assertFalse("payments" in response.json()["results"][1].keys())
         self.assertFalse("password" in response.json()["results"][1].keys())
 
+    @override_settings(PROFILE_PAYMENTS_LIMIT=3)
+    def test_user_payments(self):
+        """Тест на платежи в профиле: последние N платежей, итоги в SQL, ссылка на список платежей"""
+
+        course = Course.objects.create(name="course")
+        for i, (amount, method, paid) in enumerate(
+            [(100, "CH", True), (200, "TF", True), (300, "TF", True), (400, "TF", False), (500, "CH", True)]
+        ):
+            Payment.objects.create(
+                user=self.user1,
+                course=course,
+                amount=amount,
+                method=method,
+                date=date(2024, 10, 1 + i) if paid else None,
+            )
+        Payment.objects.create(user=self.user2, course=course, amount=1000, method="CH", date=date(2024, 10, 1))
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(reverse("users:detail-user", args=(self.user1.pk,)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([payment["amount"] for payment in response.json()["payments"]], [500, 400, 300])
+        self.assertEqual(
+            response.json()["payments_summary"],
+            {
+                "count": 4,
+                "amount": 1100,
+                "methods": {"CH": {"count": 2, "amount": 600}, "TF": {"count": 2, "amount": 500}},
+            },
+        )
+
+        # Ссылка ведет на собственные платежи, чужие не видны
+        response = self.client.get(response.json()["payments_url"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 5)
+        response = self.client.get(reverse("users:payments-list"), {"user": self.user2.pk})
+        self.assertEqual(response.json()["count"], 0)
+
+    def test_user_list_payments_num_queries(self):
+        """Тест на количество запросов списка пользователей: платежи и итоги - по одному запросу на страницу"""
+
+        course = Course.objects.create(name="course")
+        url = reverse("users:list-user")
+        self.client.force_authenticate(user=self.moderator)
+        self.client.get(url)
+
+        # count + пользователи + последние платежи + итоги
+        for user in (self.user1, self.user2, self.moderator):
+            Payment.objects.bulk_create(
+                Payment(user=user, course=course, amount=100, method="CH", date=date(2024, 10, 1)) for _ in range(10)
+            )
+            with self.assertNumQueries(4):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for user in response.json()["results"]:
+            self.assertEqual(len(user["payments"]), 5)
+            self.assertEqual(user["payments_summary"]["count"], 10)
+
+    def test_user_list_sparse_fields(self):
+        """Тест на сокращенное представление списка пользователей"""
+
+        url = reverse("users:list-user")
+        self.client.force_authenticate(user=self.moderator)
+        response = self.client.get(url, {"fields": "id,email"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"][0], {"id": self.moderator.pk, "email": self.moderator.email})
+
+    def test_user_roles_cache(self):
+        """Тест на кеширование роли модератора и сброс кеша при изменении групп"""
+
+        # Чужой платеж виден только модератору
+        course = Course.objects.create(name="course")
+        Payment.objects.create(user=self.user1, course=course, amount=100, method="CH", date=date(2024, 10, 1))
+        url = reverse("users:payments-list")
+
+        def get_count():
+            response = self.client.get(url, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response.json()["count"]
+
+        self.client.force_authenticate(user=self.moderator)
+        self.assertEqual(get_count(), 1)
+        # Роль из кеша: только count и страница платежей
+        with self.assertNumQueries(2):
+            self.assertEqual(get_count(), 1)
+
+        # Удаление из группы (с обеих сторон связи)
+        self.moderator.groups.clear()
+        self.assertEqual(get_count(), 0)
+        group_moderator = Group.objects.get(name="moderators")
+        group_moderator.user_set.add(self.moderator)
+        self.assertEqual(get_count(), 1)
+        group_moderator.user_set.clear()
+        self.assertEqual(get_count(), 0)
+        # Удаление группы
+        self.moderator.groups.add(group_moderator)
+        self.assertEqual(get_count(), 1)
+        group_moderator.delete()
+        self.assertEqual(get_count(), 0)
+
+        # Удаление пользователя: его id может достаться новому
+        self.assertIsNotNone(cache.get(get_roles_cache_key(self.moderator.pk)))
+        self.moderator.delete()
+        self.assertIsNone(cache.get(get_roles_cache_key(self.moderator.pk)))
+
+    @override_settings(ROLES_FROM_TOKEN=True)
+    def test_user_roles_from_token(self):
+        """Тест на роль из claim access-токена"""
+
+        self.moderator.set_password("test")
+        self.moderator.save()
+        response = self.client.post(
+            reverse("users:login"), {"email": self.moderator.email, "password": "test"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AccessToken(response.json()["access"])["roles"], ["moderators"])
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        # проверка активности пользователя + count
+        with self.assertNumQueries(2) as context:
+            response = self.client.get(reverse("users:payments-list"), format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any("auth_group" in query["sql"] for query in context.captured_queries))
+
+    @override_settings(ROLES_FROM_TOKEN=True)
+    def test_user_roles_token_refresh(self):
+        """Тест на обновление ролей в access-токене при обновлении по refresh-токену"""
+
+        self.moderator.set_password("test")
+        self.moderator.save()
+        response = self.client.post(
+            reverse("users:login"), {"email": self.moderator.email, "password": "test"}, format="json"
+        )
+        refresh = response.json()["refresh"]
+        self.assertNotIn("roles", RefreshToken(refresh))
+
+        self.moderator.groups.clear()
+        response = self.client.post(reverse("users:token_refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AccessToken(response.json()["access"])["roles"], [])
+
+        # Отключенному пользователю новый access-токен не выдается
+        self.moderator.is_active = False
+        self.moderator.save()
+        response = self.client.post(reverse("users:token_refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stateless_authentication(self):
+        """Тест на аутентификацию по токену без загрузки пользователя из БД"""
+
+        self.user1.set_password("test")
+        self.user1.save()
+        response = self.client.post(reverse("users:login"), {"email": self.user1.email, "password": "test"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+
+        url = reverse("education:course-list")
+        self.client.get(url, format="json")
+        # Активность пользователя уже в кеше: только count
+        with self.assertNumQueries(1) as context:
+            response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any("users_user" in query["sql"] for query in context.captured_queries))
+
+        # Создание курса: владелец проставляется без загрузки пользователя
+        response = self.client.post(url, {"name": "test"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Course.objects.get(name="test").owner, self.user1)
+
+        # Свой профиль: пользователь совпадает с объектом
+        response = self.client.get(reverse("users:detail-user", args=(self.user1.pk,)), format="json")
+        self.assertTrue("password" in response.json().keys())
+
+        # Отключенный пользователь сразу теряет доступ
+        self.user1.is_active = False
+        self.user1.save()
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stateless_user_lazy_fields(self):
+        """Тест на отложенную загрузку полей пользователя из токена"""
+
+        token = AccessToken.for_user(self.user1)
+        token["email"] = self.user1.email
+        user = StatelessUser.from_token(token)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.pk, self.user1.pk)
+            self.assertEqual(str(user), self.user1.email)
+            self.assertEqual(user, self.user1)
+        # Все остальные поля загружаются одним запросом
+        with self.assertNumQueries(1):
+            self.assertEqual(user.first_name, "")
+            self.assertIsNone(user.phone)
+            self.assertFalse(user.is_staff)
+
     def test_user_update(self):
         """Тест на редактирование профиля пользователя"""
 
@@ -158,6 +380,7 @@ class UserTestCase(APITestCase):
 class PaymentTestCase(APITestCase):
 
     def setUp(self):
+        cache.clear()
         self.user1 = User.objects.create(email="user1@test.ru")
         self.user2 = User.objects.create(email="user2@test.ru")
         self.moderator = User.objects.create(email="moderator@test.ru")
@@ -198,6 +421,7 @@ class PaymentTestCase(APITestCase):
                 "user": self.pay1.user.id,
                 "session_id": self.pay1.session_id,
                 "link": self.pay1.link,
+                "status": self.pay1.status,
             },
             {
                 "amount": self.pay2.amount,
@@ -209,6 +433,7 @@ class PaymentTestCase(APITestCase):
                 "user": self.pay2.user.id,
                 "session_id": self.pay2.session_id,
                 "link": self.pay2.link,
+                "status": self.pay2.status,
             },
         ]
 
@@ -216,12 +441,487 @@ class PaymentTestCase(APITestCase):
         # Неавторизован
         response = self.client.get(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
-        # Пользователь
+        # Пользователь - только свои платежи, в том числе без фильтра и с фильтром по чужому id
         self.client.force_authenticate(user=self.user1)
         response = self.client.get(url, format="json")
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"], data[:1])
+        response = self.client.get(url, {"user": self.user2.pk}, format="json")
+        self.assertEqual(response.json()["results"], [])
         # Модератор
         self.client.force_authenticate(user=self.moderator)
         response = self.client.get(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()["results"], data)
+
+    def test_payments_list_cursor(self):
+        """Тест на пагинацию списка платежей по курсору (по дате, включая неоплаченные)"""
+
+        for i in range(15):
+            Payment.objects.create(
+                user=self.user1,
+                course=self.course1,
+                amount=100 + i,
+                method="TF",
+                date=None if i % 3 == 0 else date(2024, 10, 1 + i % 4),
+            )
+        expected = list(Payment.objects.order_by(F("date").desc(nulls_first=True), "-id").values_list("id", flat=True))
+
+        url = reverse("users:payments-list")
+        self.client.force_authenticate(user=self.moderator)
+        ids, pages = [], []
+        next_url = f"{url}?pagination=cursor&page_size=4"
+        while next_url:
+            response = self.client.get(next_url, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.json())
+            ids += [payment["id"] for payment in response.json()["results"]]
+            next_url = response.json()["next"]
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 5)
+
+        # Назад по страницам
+        ids = []
+        previous_url = pages[-1]["previous"]
+        while previous_url:
+            response = self.client.get(previous_url, format="json")
+            ids = [payment["id"] for payment in response.json()["results"]] + ids
+            previous_url = response.json()["previous"]
+        self.assertEqual(ids, expected[: len(expected) - len(pages[-1]["results"])])
+
+
+@override_settings(STRIPE_API_KEY="sk_test")
+class PaymentCreateTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="user@test.ru")
+        self.course = Course.objects.create(name="course")
+        self.lesson = Lesson.objects.create(name="lesson", course=self.course, owner=self.user)
+        self.url = reverse("users:payments-create")
+        self.client.force_authenticate(user=self.user)
+
+    def test_payment_create_reuses_price(self):
+        """Тест на переиспользование цены Stripe: продукт создается один раз на курс/урок и сумму"""
+
+        with FakeStripeServer() as server, override_settings(STRIPE_API_BASE=server.url):
+            for data in (
+                {"course": self.course.pk, "amount": 100, "method": "TF"},
+                {"course": self.course.pk, "amount": 100, "method": "TF"},
+                {"lesson": self.lesson.pk, "amount": 100, "method": "TF"},
+                {"course": self.course.pk, "amount": 200, "method": "TF"},
+            ):
+                response = self.client.post(self.url, data, format="json")
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+                self.assertTrue(response.json()["link"].startswith("https://checkout.stripe.com/cs_open_"))
+
+            # Без кеша цена берется из базы
+            cache.clear()
+            response = self.client.post(self.url, {"lesson": self.lesson.pk, "amount": 100, "method": "TF"})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(server.posts.count("/v1/products"), 3)
+        self.assertEqual(server.posts.count("/v1/checkout/sessions"), 5)
+        self.assertEqual(
+            set(StripePrice.objects.values_list("course", "lesson", "amount")),
+            {(self.course.pk, None, 100), (None, self.lesson.pk, 100), (self.course.pk, None, 200)},
+        )
+        self.assertEqual(Payment.objects.exclude(session_id__startswith="cs_open_").count(), 0)
+
+    def test_payment_create_async(self):
+        """Тест на асинхронное создание сессии оплаты: ответ 202 без обращения к Stripe, ссылка - из фоновой задачи"""
+
+        data = {"course": self.course.pk, "amount": 100, "method": "TF"}
+        with mock.patch.object(create_checkout_session, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, data, format="json", HTTP_PREFER="respond-async")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        payment_id = response.json()["id"]
+        status_url = response.json()["status_url"]
+        self.assertEqual(response["Location"], status_url)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(response.json()["status"], "pending")
+        self.assertIsNone(response.json()["link"])
+        delay.assert_called_once_with(payment_id)
+
+        response = self.client.get(status_url)
+        self.assertEqual(response.json()["status"], "pending")
+
+        with FakeStripeServer() as server, override_settings(STRIPE_API_BASE=server.url):
+            create_checkout_session(payment_id)
+            # Повторный запуск задачи не создает вторую сессию
+            create_checkout_session(payment_id)
+        self.assertEqual(server.posts, ["/v1/products", "/v1/checkout/sessions"])
+
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["status"], "ready")
+        self.assertEqual(response.json()["session_id"], "cs_open_2")
+        self.assertEqual(response.json()["link"], "https://checkout.stripe.com/cs_open_2")
+
+    def test_payment_create_async_failed(self):
+        """Тест на ошибку Stripe в фоновой задаче: после повторов платеж получает статус failed"""
+
+        payment = Payment.objects.create(user=self.user, course=self.course, amount=100, method="TF", status="pending")
+        with FakeStripeServer() as server:
+            url = server.url
+        # Сервер остановлен - соединение отклоняется
+        with override_settings(STRIPE_API_BASE=url):
+            create_checkout_session.apply(args=(payment.pk,))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "failed")
+        self.assertIsNone(payment.link)
+
+    def test_payment_status(self):
+        """Тест на доступ к статусу платежа и заголовок Retry-After, пока платеж не готов"""
+
+        payment = Payment.objects.create(user=self.user, course=self.course, amount=100, method="TF", status="pending")
+        url = reverse("users:payments-status", args=(payment.pk,))
+
+        response = self.client.get(url)
+        self.assertEqual(response.json()["status"], "pending")
+        self.assertEqual(response["Retry-After"], "1")
+
+        Payment.objects.filter(pk=payment.pk).update(status="ready", link="http://pay")
+        response = self.client.get(url)
+        self.assertEqual(response.json()["status"], "ready")
+        self.assertFalse(response.has_header("Retry-After"))
+
+        # Чужой платеж не виден, модератору доступен
+        other = User.objects.create(email="other@test.ru")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        Group.objects.create(name="moderators").user_set.add(other)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+
+class CheckPaymentsTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="user@test.ru")
+        self.course = Course.objects.create(name="course")
+
+    def create_payments(self, count, prefix, age=timedelta(hours=2)):
+        created_at = timezone.now() - age
+        return Payment.objects.bulk_create(
+            Payment(
+                user=self.user,
+                course=self.course,
+                amount=100,
+                method="TF",
+                session_id=f"{prefix}{i}",
+                link="http://pay",
+                created_at=created_at,
+            )
+            for i in range(count)
+        )
+
+    def test_check_payments(self):
+        """Тест на сверку платежей: оплаченные сохраняются пачкой, остальные не меняются"""
+
+        self.create_payments(5, "cs_paid_")
+        self.create_payments(3, "cs_open_")
+        self.create_payments(2, "cs_missing_")
+        Payment.objects.create(user=self.user, amount=100, method="TF")
+        # Свежие (ждем вебхук) и слишком старые (сессия истекла) платежи не проверяются
+        self.create_payments(2, "cs_paid_fresh_", age=timedelta(minutes=5))
+        self.create_payments(2, "cs_paid_old_", age=timedelta(days=3))
+
+        with FakeStripeServer() as server, override_settings(STRIPE_API_BASE=server.url):
+            completed = check_payments()
+
+        self.assertEqual(completed, 5)
+        self.assertEqual(server.requests, 10)
+        paid = Payment.objects.filter(session_id__regex=r"^cs_paid_[0-9]+$")
+        self.assertFalse(paid.filter(date=None).exists())
+        self.assertFalse(paid.exclude(link="").exists())
+        self.assertEqual(Payment.objects.filter(date=None).count(), 10)
+
+    @override_settings(STRIPE_CONCURRENCY=8, STRIPE_RATE_LIMIT=0, STRIPE_CHECK_CHUNK_SIZE=16)
+    def test_check_payments_throughput(self):
+        """Тест на пропускную способность: запросы идут параллельно по переиспользуемым соединениям"""
+
+        count, delay = 48, 0.05
+        self.create_payments(count, "cs_paid_")
+
+        with FakeStripeServer(delay=delay) as server, override_settings(STRIPE_API_BASE=server.url):
+            started = time.monotonic()
+            completed = check_payments()
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(completed, count)
+        # Последовательно это заняло бы count * delay = 2.4 с
+        self.assertLess(elapsed, count * delay / 3)
+        self.assertLessEqual(len(server.connections), 8)
+
+    @override_settings(STRIPE_CONCURRENCY=8, STRIPE_RATE_LIMIT=50)
+    def test_check_payments_rate_limit(self):
+        """Тест на ограничение частоты запросов к Stripe"""
+
+        self.create_payments(20, "cs_open_")
+
+        with FakeStripeServer() as server, override_settings(STRIPE_API_BASE=server.url):
+            started = time.monotonic()
+            check_payments()
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(server.requests, 20)
+        # 20 запросов при 50 в секунду - не быстрее 19 интервалов по 0.02 с
+        self.assertGreaterEqual(elapsed, 19 / 50)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class PaymentWebhookTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="user@test.ru")
+        self.course = Course.objects.create(name="course")
+        self.payment = Payment.objects.create(
+            user=self.user, course=self.course, amount=100, method="TF", session_id="cs_test_1", link="http://pay"
+        )
+        self.url = reverse("users:payments-webhook")
+
+    def post_event(self, event, secret="whsec_test"):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+        return self.client.generic(
+            "POST",
+            self.url,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+        )
+
+    def get_event(self, session_id="cs_test_1", event_type="checkout.session.completed", payment_status="paid"):
+        return {
+            "id": "evt_1",
+            "object": "event",
+            "type": event_type,
+            "data": {"object": {"id": session_id, "object": "checkout.session", "payment_status": payment_status}},
+        }
+
+    def test_webhook(self):
+        """Тест на подтверждение платежа вебхуком и повторную доставку события"""
+
+        # update платежа по индексу session_id
+        with self.assertNumQueries(1):
+            response = self.post_event(self.get_event())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.date, timezone.localdate())
+        self.assertEqual(self.payment.link, "")
+
+        # Повторная доставка ничего не меняет
+        Payment.objects.filter(pk=self.payment.pk).update(date="2024-10-10")
+        response = self.post_event(self.get_event())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.date, date(2024, 10, 10))
+
+    def test_webhook_ignored_events(self):
+        """Тест на события, которые не подтверждают платеж"""
+
+        for event in (
+            self.get_event(payment_status="unpaid"),
+            self.get_event(event_type="checkout.session.expired"),
+            self.get_event(session_id="cs_unknown"),
+        ):
+            response = self.post_event(event)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.payment.refresh_from_db()
+        self.assertIsNone(self.payment.date)
+
+    def test_webhook_signature(self):
+        """Тест на проверку подписи вебхука"""
+
+        response = self.post_event(self.get_event(), secret="whsec_wrong")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, self.get_event(), format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.payment.refresh_from_db()
+        self.assertIsNone(self.payment.date)
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=None)
+    def test_webhook_not_configured(self):
+        """Тест на вебхук без STRIPE_WEBHOOK_SECRET: 503 вместо ошибки сервера"""
+
+        response = self.post_event(self.get_event())
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("STRIPE_WEBHOOK_SECRET", response.json()["detail"])
+        self.payment.refresh_from_db()
+        self.assertIsNone(self.payment.date)
+
+
+@override_settings(LAST_LOGIN_BUFFER_URL="memory://")
+class LastLoginTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        # Буфер общий для процесса: входы из других тестов отбрасываются
+        with get_last_login_buffer().flushing():
+            pass
+        self.user = User.objects.create(email="user@test.ru", last_login=timezone.now() - timedelta(days=31))
+        self.user.set_password("test")
+        self.user.save()
+
+    def login(self):
+        response = self.client.post(reverse("users:login"), {"email": self.user.email, "password": "test"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_last_login_buffered(self):
+        """Тест на буферизацию last_login: вход не пишет в таблицу пользователей, сброс - одним UPDATE"""
+
+        old_last_login = self.user.last_login
+        # пользователь + роли для токена
+        with self.assertNumQueries(2) as context:
+            self.login()
+        self.assertFalse(any(query["sql"].startswith("UPDATE") for query in context.captured_queries))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, old_last_login)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_last_logins(), 1)
+        self.user.refresh_from_db()
+        self.assertGreater(self.user.last_login, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(flush_last_logins(), 0)
+
+    @override_settings(LAST_LOGIN_FLUSH_INTERVAL=timedelta(0))
+    def test_last_login_memory_flush_on_record(self):
+        """Тест на сброс буфера в памяти при входе, если сброса давно не было"""
+
+        self.login()
+        self.user.refresh_from_db()
+        self.assertGreater(self.user.last_login, timezone.now() - timedelta(minutes=1))
+
+    def test_last_login_flush_failure(self):
+        """Тест на сохранение входов в буфере, если запись в БД не удалась"""
+
+        self.login()
+        with mock.patch.object(User.objects, "bulk_update", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                flush_last_logins()
+        self.assertEqual(flush_last_logins(), 1)
+        self.user.refresh_from_db()
+        self.assertGreater(self.user.last_login, timezone.now() - timedelta(minutes=1))
+
+    @override_settings(LAST_LOGIN_BUFFER_URL=None)
+    def test_last_login_without_buffer(self):
+        """Тест на запись last_login при входе, если общего хранилища для буфера нет"""
+
+        self.login()
+        self.user.refresh_from_db()
+        self.assertGreater(self.user.last_login, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(flush_last_logins(), 0)
+
+    def test_disable_inactive_users_flushes_last_login(self):
+        """Тест на сброс буфера входов перед отключением неактивных пользователей"""
+
+        self.login()
+        self.assertEqual(disable_inactive_users()["disabled"], 0)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+
+class DisableInactiveUsersTestCase(TestCase):
+
+    @override_settings(USER_DISABLE_CHUNK_SIZE=3)
+    def test_disable_inactive_users(self):
+        """Тест на отключение неактивных пользователей пачками"""
+
+        cache.clear()
+        old, recent = timezone.now() - timedelta(days=31), timezone.now() - timedelta(days=1)
+        inactive = User.objects.bulk_create(User(email=f"inactive{i}@test.ru", last_login=old) for i in range(7))
+        active = [
+            User.objects.create(email="recent@test.ru", last_login=recent),
+            User.objects.create(email="never@test.ru"),
+            User.objects.create(email="staff@test.ru", last_login=old, is_staff=True),
+            User.objects.create(email="admin@test.ru", last_login=old, is_superuser=True),
+        ]
+        self.assertTrue(is_user_active(inactive[0].pk))
+
+        # На пачку: выбор id + UPDATE; последний выбор пустой
+        with self.assertNumQueries(3 * 2 + 1):
+            metrics = disable_inactive_users()
+
+        self.assertEqual(metrics["disabled"], 7)
+        self.assertEqual(metrics["chunks"], 3)
+        self.assertFalse(User.objects.filter(pk__in=[user.pk for user in inactive], is_active=True).exists())
+        self.assertEqual(User.objects.filter(pk__in=[user.pk for user in active], is_active=True).count(), 4)
+        # Кеш проверки активности для stateless-аутентификации сброшен
+        self.assertFalse(is_user_active(inactive[0].pk))
+
+        self.assertEqual(disable_inactive_users()["disabled"], 0)
+
+
+@skipUnless(connection.vendor == "postgresql", "Планы запросов PostgreSQL")
+class PaymentIndexTestCase(TestCase):
+
+    def test_payment_queries_use_indexes(self):
+        """
+        Тест на индексы: на таблице, где индекс выгоднее полного чтения, планировщик сам выбирает его
+        для списка платежей, сверки неоплаченных и вебхука (полное чтение не запрещается)
+        """
+
+        course_id, lesson_id = seed_payments(20000)
+        with connection.cursor() as cursor:
+            # Свежая статистика, чтобы план не зависел от того, успел ли autovacuum
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(Payment._meta.db_table)}")
+
+        indexes = {}
+        for name, queryset in get_payment_queries(course_id, lesson_id).items():
+            scans, _ = explain(queryset)
+            self.assertTrue(uses_index(scans), f"{name}: {scans}")
+            indexes[name] = {index for _, index in scans if index}
+
+        # Планировщик может дополнительно взять другие индексы (например, BitmapAnd), важно, что нужный используется
+        expected = {
+            "list": "payment_date_idx",
+            "list_course": "payment_course_date_idx",
+            "list_lesson": "payment_lesson_date_idx",
+            "list_method": "payment_method_date_idx",
+            "pending_scan": "payment_pending_idx",
+        }
+        for name, index in expected.items():
+            self.assertIn(index, indexes[name], name)
+
+
+class FillTestCase(TestCase):
+
+    sizes = {"users": 60, "courses": 12, "lessons": 40, "subscriptions": 150, "payments": 300}
+
+    def test_fill(self):
+        """Тест на заполнение синтетическими данными через COPY и bulk_create"""
+
+        with mock.patch("sys.stdout"):
+            call_command("fill", seed=1, **self.sizes)
+            call_command("fill", seed=2, bulk_create=True, batch_size=7, **self.sizes)
+
+        self.assertTrue(Group.objects.filter(name="moderators").exists())
+        self.assertEqual(User.objects.count(), 120)
+        self.assertEqual(Course.objects.count(), 24)
+        self.assertEqual(Lesson.objects.count(), 80)
+        self.assertEqual(Payment.objects.count(), 600)
+        self.assertTrue(290 <= Subscription.objects.count() <= 300)
+        self.assertEqual(Payment.objects.filter(course__isnull=True, lesson__isnull=True).count(), 0)
+        self.assertTrue(User.objects.get(email="fill1@example.com").check_password("password"))
+        # Счетчики id сдвинуты за явно записанные id
+        self.assertEqual(User.objects.create(email="new@test.ru").pk, 121)
+
+        # Подписчики по степенному закону: у первого курса больше, чем у последних трех вместе
+        counts = [Subscription.objects.filter(course_id=course_id).count() for course_id in range(1, 13)]
+        self.assertGreater(counts[0], sum(counts[-3:]))
+
+    def test_fill_deterministic(self):
+        """Тест на одинаковые данные при одинаковом seed"""
+
+        now = timezone.now()
+
+        def get_rows(seed):
+            generator = FillGenerator(seed=seed, **self.sizes)
+            generator.now = now
+            with mock.patch("users.generators.make_password", return_value="hash"):
+                return [list(rows) for _, _, rows in generator.get_tables()]
+
+        self.assertEqual(get_rows(1), get_rows(1))
+        self.assertNotEqual(get_rows(1), get_rows(2))
@@ -21,4 +21,6 @@ urlpatterns = [
     path("delete/<int:pk>/", views.UserDestroyAPIView.as_view(), name="destroy-user"),
     path("payments/", views.PaymentListAPIView.as_view(), name="payments-list"),
     path("payments/create/", views.PaymentCreateAPIView.as_view(), name="payments-create"),
+    path("payments/<int:pk>/status/", views.PaymentStatusAPIView.as_view(), name="payments-status"),
+    path("payments/webhook/", views.PaymentWebhookAPIView.as_view(), name="payments-webhook"),
 ]
@@ -1,19 +1,47 @@
-from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from rest_framework import generics, status
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
+from edu.paginators import PaginationModeMixin
 from edu.permissions import IsModerator
-from users.models import User, Payment
+from users.models import PAYMENT_PENDING, User, Payment
+from users.paginators import PaymentKeysetPagination
 from users.permissions import IsOwnerUserProfile
+from users.roles import is_moderator
 from users.serializers import (
     PaymentSerializer,
+    PaymentStatusSerializer,
     RegisterSerializer,
     UserOwnerSerializer,
     UserGeneralSerializer,
     UserModeratorSerializer,
 )
-from users.services import create_product, create_session
+from users.services import (
+    confirm_payment,
+    construct_webhook_event,
+    create_session,
+    get_price_id,
+    get_recent_payments_prefetch,
+)
+from users.tasks import create_checkout_session
+
+
+def get_user_queryset(queryset, serializer_class, request):
+    """Пользователи для сериализатора: только запрошенные поля (?fields), последние платежи - одним запросом"""
+
+    fields = serializer_class.get_requested_fields(request)
+    if fields is not None:
+        queryset = queryset.only(*serializer_class.get_model_fields(fields))
+    if "payments" in serializer_class.Meta.fields and (fields is None or "payments" in fields):
+        queryset = queryset.prefetch_related(get_recent_payments_prefetch())
+    return queryset.all()
 
 
 class UserCreateAPIView(generics.CreateAPIView):
@@ -47,12 +75,15 @@ class UserRetrieveAPIView(generics.RetrieveAPIView):
 
     def get_serializer_class(self):
 
-        if self.request.user == self.get_object():
+        if str(self.request.user.pk) == str(self.kwargs.get(self.lookup_field)):
             return UserOwnerSerializer
-        elif self.request.user.groups.filter(name="moderators").exists():
+        elif is_moderator(self.request):
             return UserModeratorSerializer
         return UserGeneralSerializer
 
+    def get_queryset(self):
+        return get_user_queryset(self.queryset, self.get_serializer_class(), self.request)
+
 
 class UserListAPIView(generics.ListAPIView):
     """
@@ -63,10 +94,13 @@ class UserListAPIView(generics.ListAPIView):
     queryset = User.objects.all()
 
     def get_serializer_class(self):
-        if self.request.user.groups.filter(name="moderators").exists():
+        if is_moderator(self.request):
             return UserModeratorSerializer
         return UserGeneralSerializer
 
+    def get_queryset(self):
+        return get_user_queryset(self.queryset, self.get_serializer_class(), self.request)
+
 
 class UserUpdateAPIView(generics.UpdateAPIView):
     """Редактирование профиля пользователя."""
@@ -91,27 +125,108 @@ class UserDestroyAPIView(generics.DestroyAPIView):
     permission_classes = (IsModerator,)
 
 
-class PaymentListAPIView(generics.ListAPIView):
-    """Список платежей."""
+class PaymentListAPIView(PaginationModeMixin, generics.ListAPIView):
+    """
+    Список платежей.
+    Модератору доступны все платежи, пользователю - только свои (фильтр ?user=<id> - ссылка из профиля).
+    """
 
-    queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    cursor_pagination_class = PaymentKeysetPagination
     ordering_fields = ("date",)
-    filterset_fields = ["course", "lesson", "method"]
-    permission_classes = (IsModerator,)
+    filterset_fields = ["user", "course", "lesson", "method"]
+
+    def get_queryset(self):
+        queryset = Payment.objects.all()
+        if getattr(self, "swagger_fake_view", False) or is_moderator(self.request):
+            return queryset
+        return queryset.filter(user=self.request.user)
 
 
 class PaymentCreateAPIView(generics.CreateAPIView):
-    """Создание платежа. Необходимо указать либо id курса, либо id урока"""
+    """
+    Создание платежа. Необходимо указать либо id курса, либо id урока.
+    С заголовком Prefer: respond-async платеж сохраняется в статусе pending, сессия оплаты
+    создается в фоне, а в ответе 202 приходит status_url для опроса статуса.
+    """
 
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
 
+    def respond_async(self):
+        return "respond-async" in self.request.headers.get("Prefer", "")
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if self.respond_async():
+            status_url = request.build_absolute_uri(reverse("users:payments-status", args=(response.data["id"],)))
+            response.data["status_url"] = status_url
+            response.status_code = status.HTTP_202_ACCEPTED
+            response["Location"] = status_url
+            response["Retry-After"] = settings.PAYMENT_STATUS_RETRY_AFTER
+            response["Preference-Applied"] = "respond-async"
+        return response
+
     def perform_create(self, serializer):
+        if self.respond_async():
+            payment = serializer.save(user=self.request.user, status=PAYMENT_PENDING)
+            transaction.on_commit(lambda: create_checkout_session.delay(payment.id))
+            return
+
         payment = serializer.save(user=self.request.user)
-        product_name = payment.course.name if payment.course else payment.lesson.name
-        product = create_product(product_name, payment.amount)
-        url, session_id = create_session(product)
+        url, session_id = create_session(get_price_id(payment))
         payment.session_id = session_id
         payment.link = url
-        payment.save()
+        payment.save(update_fields=["session_id", "link"])
+
+
+class PaymentStatusAPIView(generics.RetrieveAPIView):
+    """
+    Статус платежа и ссылка на оплату. Доступен владельцу платежа и модератору.
+    Пока платеж в статусе pending, ответ приходит сразу с заголовком Retry-After
+    (PAYMENT_STATUS_RETRY_AFTER секунд) - через сколько повторить запрос.
+    """
+
+    serializer_class = PaymentStatusSerializer
+
+    def get_queryset(self):
+        queryset = Payment.objects.only(*PaymentStatusSerializer.Meta.fields)
+        if getattr(self, "swagger_fake_view", False) or is_moderator(self.request):
+            return queryset
+        return queryset.filter(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if response.data["status"] == PAYMENT_PENDING:
+            response["Retry-After"] = settings.PAYMENT_STATUS_RETRY_AFTER
+        return response
+
+
+class PaymentWebhookAPIView(APIView):
+    """
+    Вебхук Stripe. Проверяет подпись и подтверждает платеж по событию checkout.session.completed.
+    Остальные события принимаются и игнорируются.
+    """
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    swagger_schema = None
+
+    def post(self, request):
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            # Без секрета подпись проверить нельзя: событие не принимается, Stripe повторит доставку
+            return Response(
+                {"detail": "Вебхук не настроен: не задан STRIPE_WEBHOOK_SECRET"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        try:
+            event = construct_webhook_event(request.body, request.headers.get("Stripe-Signature", ""))
+        except (ValueError, stripe.SignatureVerificationError):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        if event["type"] == "checkout.session.completed":
+            session = event["data"]["object"]
+            if session.get("payment_status") == "paid":
+                confirm_payment(session["id"])
+
+        return Response(status=status.HTTP_200_OK)